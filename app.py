@@ -1,13 +1,65 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from domains.trading.service import run_trading_decision
-from domains.hiring.service import run_hiring_decision
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import BaseModel, Field
+from domains.trading.service import (
+    run_trading_decision,
+    run_trading_batch,
+    stream_trading_decisions,
+    stream_trading_events,
+    submit_trading_job,
+    BATCH_CONCURRENCY,
+    BATCH_PACK_SIZE,
+)
+from domains.hiring.service import run_hiring_decision, stream_hiring_events, submit_hiring_job
+from engine.reviews import resume_review, list_pending, get_decision
+from engine.graph import close_app, warm_up
+from engine import metrics
+from engine.llm import cache as llm_cache, hedge, limiters
+from engine.memory import writer as memory_writer
+from engine.logging import logger as event_logger
+from engine.singleflight import decisions
+from engine.jobs import pool as job_pool, job_status, JobQueueFull, JOB_RUNNER
 
-app = FastAPI()
+
+# "warm": serve immediately, build graph/clients in the background (default)
+# "eager": finish warming before accepting requests
+# "lazy": build everything on the first request that needs it
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warm")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warming = None
+    if STARTUP_MODE == "eager":
+        await warm_up()
+    elif STARTUP_MODE == "warm":
+        warming = asyncio.create_task(warm_up())
+    if JOB_RUNNER == "inline":
+        job_pool.start()
+    yield
+    if warming is not None:
+        warming.cancel()
+    await job_pool.stop()
+    await close_app()
+
+
+app = FastAPI(lifespan=lifespan)
 
 class TradeRequest(BaseModel):
     symbol: str
 
+class TradeBatchRequest(BaseModel):
+    symbols: List[str]
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1, le=256)
+    # symbols per packed LLM prompt; 1 disables packing
+    pack_size: int = Field(BATCH_PACK_SIZE, ge=1, le=50)
+    stream: bool = False
+
 class HiringRequest(BaseModel):
     candidate_profile: str
 
@@ -15,24 +67,139 @@ class HumanOverride(BaseModel):
     request_id: str
     decision: str
     reason: str
-pending_reviews = {}
 
 @app.post("/trade")
-def trade(req: TradeRequest):
-    return run_trading_decision(req.symbol)
+async def trade(req: TradeRequest):
+    return await run_trading_decision(req.symbol)
+
+
+def _sse(events):
+    async def gen():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+@app.post("/trade/stream")
+async def trade_stream(req: TradeRequest):
+    return _sse(stream_trading_events(req.symbol))
+
+
+@app.post("/trade/batch")
+async def trade_batch(req: TradeBatchRequest):
+    """
+    One entry per submitted symbol, in completion order (NDJSON with
+    stream=true). A symbol listed more than once is decided once; each
+    of its entries carries the same result and request_id.
+    """
+    if not req.stream:
+        return await run_trading_batch(req.symbols, req.concurrency, pack_size=req.pack_size)
+
+    async def ndjson():
+        async for item in stream_trading_decisions(req.symbols, req.concurrency, pack_size=req.pack_size):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _accepted(submit, *args):
+    try:
+        request_id = submit(*args)
+    except JobQueueFull as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
+    location = f"/jobs/{request_id}"
+    return JSONResponse(
+        {"request_id": request_id, "status": "queued", "location": location},
+        status_code=202,
+        headers={"Location": location},
+    )
+
+
+@app.post("/trade/jobs")
+def trade_job(req: TradeRequest):
+    return _accepted(submit_trading_job, req.symbol)
 
 
 @app.post("/hiring")
-def hiring(req: HiringRequest):
-    return run_hiring_decision(req.candidate_profile)
+async def hiring(req: HiringRequest):
+    return await run_hiring_decision(req.candidate_profile)
+
+
+@app.post("/hiring/stream")
+async def hiring_stream(req: HiringRequest):
+    return _sse(stream_hiring_events(req.candidate_profile))
+
+
+@app.post("/hiring/jobs")
+def hiring_job(req: HiringRequest):
+    return _accepted(submit_hiring_job, req.candidate_profile)
+
+
+@app.get("/jobs/{request_id}")
+def job(request_id: str):
+    status = job_status(request_id)
+    if status is None:
+        raise HTTPException(404, f"no job {request_id}")
+    return status
+
+
+@app.get("/human/pending")
+def human_pending(domain: Optional[str] = None, limit: int = 100):
+    return list_pending(domain, limit)
 
 
 @app.post("/human/override")
-def human_override(req: HumanOverride):
-    state = pending_reviews.pop(req.request_id)
+async def human_override(req: HumanOverride):
+    state = await resume_review(req.request_id, req.decision, req.reason)
+    if state is None:
+        raise HTTPException(404, f"no pending review for {req.request_id}")
+    return state
+
+
+@app.get("/decisions/{request_id}")
+def decision(request_id: str):
+    record = get_decision(request_id)
+    if record is None:
+        raise HTTPException(404, f"no decision recorded for {request_id}")
+    return record
+
+
+def _component_stats():
+    # counters kept by individual components, exposed as-is
+    for prefix, stats in (
+        ("fsm_llm_cache", llm_cache.stats),
+        ("fsm_llm_hedge", hedge.stats),
+        ("fsm_memory_writer", memory_writer.stats),
+        ("fsm_event_log", event_logger.stats),
+        ("fsm_singleflight", decisions.stats),
+        ("fsm_jobs", job_pool.stats),
+    ):
+        for key, value in stats.items():
+            yield f"{prefix}_{key}", "gauge", f"{prefix} {key}", value
+    yield "fsm_memory_writer_depth", "gauge", "Records queued for the memory writer", memory_writer.depth()
+    for model, limiter in limiters.items():
+        for key, value in limiter.stats.items():
+            yield f"fsm_llm_limiter_{key}", "gauge", f"fsm_llm_limiter {key} ({model})", value
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.render(_component_stats()),
+        media_type="text/plain; version=0.0.4",
+    )
 
-    state["human_override"] = req.decision
-    state["human_reason"] = req.reason
-    state["final_recommendation"] = req.decision
 
-    return state
\ No newline at end of file
+@app.get("/usage")
+def usage_ledger(group_by: str = "domain,agent,model"):
+    """Token and cost totals since start, grouped by any of domain, agent, model."""
+    keys = [k for k in group_by.split(",") if k in ("domain", "agent", "model")]
+    ledger = {}
+    for (domain, agent, model, kind), value in metrics.llm_tokens.items():
+        labels = {"domain": domain, "agent": agent, "model": model}
+        row = ledger.setdefault(tuple(labels[k] for k in keys), {**{k: labels[k] for k in keys}, "cost_usd": 0.0})
+        row[kind] = row.get(kind, 0) + value
+    for (domain, agent, model), value in metrics.llm_cost.items():
+        labels = {"domain": domain, "agent": agent, "model": model}
+        ledger[tuple(labels[k] for k in keys)]["cost_usd"] += value
+    return sorted(ledger.values(), key=lambda r: r["cost_usd"], reverse=True)
@@ -0,0 +1,151 @@
+"""
+Executor overhead: LangGraph StateGraph.compile() vs engine.fsm.Machine.
+
+Both run the decision flow of engine/graph.py with call_llm replaced by
+an instant answer, so what is left is the executor's own per-decision
+cost plus the (shared) node bodies: logging, metrics, memory enqueue.
+
+    python -m bench.engines --decisions 2000 --concurrency 1,64 --out engines.json
+
+--failure-rate makes agents fail some attempts so the retry edges and
+skip paths are exercised too.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+
+from bench.run import _git_commit, percentile
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Decision executor overhead benchmark")
+    parser.add_argument("--decisions", type=int, default=2000)
+    parser.add_argument("--concurrency", default="1,64")
+    parser.add_argument("--modes", default="parallel,sequential")
+    parser.add_argument("--failure-rate", type=float, default=0.1,
+                        help="fraction of agent attempts that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def configure_env(workdir):
+    # engine modules read these at import time
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["LOG_LEVEL"] = "ERROR"
+    os.environ["MEMORY_DB"] = os.path.join(workdir, "memory.db")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.db")
+    os.environ["REVIEW_DB"] = os.path.join(workdir, "reviews.db")
+
+
+def install_fake_llm(graph, failure_rate):
+    from engine.parsing import SignalParseError
+
+    async def call_llm(prompt, domain=None, timeout=None, agent=None, usage=None, attempt=1):
+        if random.random() < failure_rate:
+            raise SignalParseError("synthetic failure")
+        return {"recommendation": "BUY", "confidence": 0.9, "reason": None}
+
+    graph.call_llm = call_llm
+    # no sleeping between attempts, only executor work is measured
+    graph.BACKOFF_BASE = 0.0
+
+
+def _state(i, deadline_for):
+    return {
+        "request_id": f"bench-{i}",
+        "domain": "trading",
+        "payload": {"symbol": f"S{i}", "agent_a_prompt": "a", "agent_b_prompt": "b"},
+        "agent_a": None,
+        "agent_b": None,
+        "final_recommendation": None,
+        "final_confidence": 0.0,
+        "trace": [],
+        "a_attempts": 0,
+        "b_attempts": 0,
+        "deadline": deadline_for("trading"),
+    }
+
+
+async def drive(executor, n, concurrency, deadline_for):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            started = time.perf_counter()
+            await executor.ainvoke(_state(i, deadline_for))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies, time.perf_counter() - started
+
+
+async def run(args):
+    from engine import graph
+
+    install_fake_llm(graph, args.failure_rate)
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": [],
+    }
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    for mode in [m for m in args.modes.split(",") if m]:
+        executors = {
+            "langgraph": graph.build_graph(mode),
+            "fsm": graph.build_machine(mode),
+        }
+        for concurrency in levels:
+            for name, executor in executors.items():
+                random.seed(args.seed)
+                # warm-up, not measured
+                await drive(executor, min(50, args.decisions), concurrency, graph.deadline_for)
+                random.seed(args.seed)
+                latencies, elapsed = await drive(executor, args.decisions, concurrency, graph.deadline_for)
+                row = {
+                    "executor": name,
+                    "mode": mode,
+                    "concurrency": concurrency,
+                    "decisions_per_second": round(args.decisions / elapsed, 1),
+                    "us_per_decision": round(1e6 * elapsed / args.decisions, 1),
+                    "latency_us": {
+                        "p50": round(1e6 * percentile(latencies, 0.50), 1),
+                        "p99": round(1e6 * percentile(latencies, 0.99), 1),
+                    },
+                }
+                report["results"].append(row)
+                print(
+                    f"{mode:10} c={concurrency:<4} {name:9} {row['decisions_per_second']:>9} dec/s  "
+                    f"{row['us_per_decision']:>8}us/dec  p50={row['latency_us']['p50']}us",
+                    file=sys.stderr,
+                )
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(workdir)
+        report = asyncio.run(run(args))
+        from engine.memory import writer
+        writer.close()
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for benchmarks.
+
+    python -m bench.fake_openai --port 8900 --latency-median 0.4 --malformed-rate 0.05
+
+Point the engine at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1.
+Latency is lognormal around --latency-median; a --malformed-rate share of
+answers is prose instead of JSON and an --error-rate share fails with
+429/500.
+"""
+import time
+import json
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def _answer(prompt: str, cfg) -> str:
+    if random.random() < cfg.malformed_rate:
+        return "I would lean towards buying here, but it depends on your risk appetite."
+
+    hiring = "candidate" in prompt
+    if random.random() < cfg.agree_rate:
+        rec = "HIRE" if hiring else "BUY"
+    else:
+        rec = random.choice(["HIRE", "HOLD", "REJECT"] if hiring else ["BUY", "SELL", "HOLD"])
+    body = json.dumps({
+        "recommendation": rec,
+        "confidence": round(random.uniform(0.6, 1.0), 2),
+        "reason": "synthetic",
+    })
+    # models wrap JSON in fences now and then
+    if random.random() < 0.2:
+        return f"```json\n{body}\n```"
+    return body
+
+
+def create_app(cfg) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        req = await request.json()
+        prompt = req["messages"][-1]["content"]
+
+        if cfg.latency_median > 0:
+            await asyncio.sleep(random.lognormvariate(0, cfg.latency_sigma) * cfg.latency_median)
+
+        if random.random() < cfg.error_rate:
+            status = random.choice([429, 500])
+            return JSONResponse(
+                {"error": {"message": "synthetic failure", "type": "server_error", "code": status}},
+                status_code=status,
+            )
+
+        content = _answer(prompt, cfg)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{random.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+
+    return app
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency-median", type=float, default=0.3,
+                        help="median completion latency in seconds (0 = answer immediately)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="lognormal shape; larger means a heavier tail")
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--agree-rate", type=float, default=0.7,
+                        help="share of answers forced to the same recommendation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int)
+    add_arguments(parser)
+    cfg = parser.parse_args()
+    if cfg.seed is not None:
+        random.seed(cfg.seed)
+    uvicorn.run(create_app(cfg), host=cfg.host, port=cfg.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Offline benchmark for the decision engine, no real tokens spent.
+
+Starts bench.fake_openai in a subprocess, points the engine at it and
+drives three targets at rising concurrency:
+
+    engine   engine.graph.app.ainvoke (bare graph, no checkpointer)
+    service  domains.trading.service.run_trading_decision
+    http     POST /trade on app.app over an in-process ASGI transport
+
+    python -m bench.run --concurrency 1,8,32,128 --requests 200 --out bench.json
+
+Prints a table to stderr and writes a JSON report (stdout or --out) that
+can be diffed across commits.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from bench import fake_openai
+
+TARGETS = ("engine", "service", "http")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline decision engine benchmark")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--concurrency", default="1,8,32,128",
+                        help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="decisions per target and concurrency level")
+    parser.add_argument("--profile-requests", type=int, default=50,
+                        help="decisions for the per-node timing pass (0 to skip)")
+    parser.add_argument("--graph-mode", default="parallel")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    fake_openai.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(args):
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "bench.fake_openai",
+        "--port", str(port),
+        "--latency-median", str(args.latency_median),
+        "--latency-sigma", str(args.latency_sigma),
+        "--malformed-rate", str(args.malformed_rate),
+        "--error-rate", str(args.error_rate),
+        "--agree-rate", str(args.agree_rate),
+    ]
+    proc = subprocess.Popen(cmd)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}/v1"
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("fake OpenAI server did not start")
+
+
+def configure_env(args, base_url, workdir):
+    # engine modules read these at import time
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["GRAPH_MODE"] = args.graph_mode
+    os.environ["LOG_LEVEL"] = "ERROR"
+    # every request uses a fresh symbol, but make sure nothing is served from cache
+    os.environ["LLM_CACHE_TTL_TRADING"] = "0"
+    os.environ["LLM_CACHE_TTL_HIRING"] = "0"
+    os.environ["MEMORY_DB"] = os.path.join(workdir, "memory.db")
+    os.environ["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.db")
+    os.environ["REVIEW_DB"] = os.path.join(workdir, "reviews.db")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+async def drive(call, n, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies, results, errors = [], [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            started = time.perf_counter()
+            try:
+                results.append(await call(i))
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return latencies, results, errors, time.perf_counter() - started
+
+
+def summarize(latencies, results, errors, elapsed):
+    retries = [
+        max(r.get("a_attempts", 0) - 1, 0) + max(r.get("b_attempts", 0) - 1, 0)
+        for r in results
+    ]
+    outcomes = {}
+    for r in results:
+        key = r.get("final_recommendation")
+        outcomes[key] = outcomes.get(key, 0) + 1
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            name: round(percentile(latencies, p) * 1000, 2)
+            for name, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "retries_total": sum(retries),
+        "retries_per_request": round(sum(retries) / len(results), 3) if results else None,
+        "outcomes": outcomes,
+    }
+
+
+def make_targets(names):
+    from engine.graph import app as graph_app
+    from domains.trading import service
+    from domains.trading.service import run_trading_decision
+
+    targets = {}
+    if "engine" in names:
+        async def engine_call(i):
+            return await graph_app.ainvoke(service._initial_state(f"ENG{i}"))
+        targets["engine"] = engine_call
+
+    if "service" in names:
+        async def service_call(i):
+            return await run_trading_decision(f"SVC{i}")
+        targets["service"] = service_call
+
+    if "http" in names:
+        import httpx
+        import app as http_app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=http_app.app),
+            base_url="http://bench",
+            timeout=None,
+        )
+
+        async def http_call(i):
+            resp = await client.post("/trade", json={"symbol": f"HTTP{i}"})
+            resp.raise_for_status()
+            return resp.json()
+        targets["http"] = http_call
+
+    return targets
+
+
+async def profile_nodes(n):
+    """Wall time per graph node, from LangChain callbacks on the bare graph."""
+    from langchain_core.callbacks import BaseCallbackHandler
+    from engine.graph import app as graph_app
+    from domains.trading import service
+
+    timings = {}
+
+    class NodeTimer(BaseCallbackHandler):
+        run_inline = True
+
+        def __init__(self):
+            self.started = {}
+
+        def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+            node = (metadata or {}).get("langgraph_node")
+            if node and kwargs.get("name") == node:
+                self.started[run_id] = (node, time.perf_counter())
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            entry = self.started.pop(run_id, None)
+            if entry:
+                node, started = entry
+                timings.setdefault(node, []).append(time.perf_counter() - started)
+
+        on_chain_error = on_chain_end
+
+    timer = NodeTimer()
+    for i in range(n):
+        await graph_app.ainvoke(
+            service._initial_state(f"PROF{i}"), {"callbacks": [timer]}
+        )
+
+    return {
+        node: {
+            "calls": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        }
+        for node, values in sorted(timings.items())
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    names = [t for t in args.targets.split(",") if t]
+    targets = make_targets(names)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": [],
+    }
+
+    for name in names:
+        for concurrency in levels:
+            latencies, results, errors, elapsed = await drive(
+                targets[name], args.requests, concurrency
+            )
+            row = {"target": name, "concurrency": concurrency}
+            row.update(summarize(latencies, results, errors, elapsed))
+            report["results"].append(row)
+            print(
+                f"{name:8} c={concurrency:<4} {row['throughput_rps']:>8} rps  "
+                f"p50={row['latency_ms']['p50']:>8}ms p95={row['latency_ms']['p95']:>8}ms "
+                f"p99={row['latency_ms']['p99']:>8}ms retries/req={row['retries_per_request']} "
+                f"errors={errors}",
+                file=sys.stderr,
+            )
+
+    if args.profile_requests:
+        report["nodes"] = await profile_nodes(args.profile_requests)
+        for node, stats in report["nodes"].items():
+            print(f"node {node:16} mean={stats['mean_ms']}ms p95={stats['p95_ms']}ms", file=sys.stderr)
+
+    from engine.graph import close_app
+    await close_app()
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    proc, base_url = start_fake_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_env(args, base_url, workdir)
+            report = asyncio.run(run(args))
+            from engine.memory import writer
+            writer.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Cold-start benchmark: how long a fresh process takes to become useful.
+
+Every sample runs in a new interpreter so nothing is warm:
+
+    import   wall time of `import app`
+    serve    uvicorn app:app until the port accepts connections
+    first    first POST /trade after the port opens (against bench.fake_openai)
+
+once per STARTUP_MODE (lazy, warm, eager), so the cost moved off the
+import path can be seen landing on the first request or in the background.
+
+    python -m bench.startup --runs 5 --out startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+
+from bench import fake_openai
+from bench.run import _free_port, _git_commit, percentile, start_fake_server
+
+MODES = ("lazy", "warm", "eager")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--symbol", default="AAPL")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    fake_openai.add_arguments(parser)
+    parser.set_defaults(latency_median=0.05, latency_sigma=0.0, malformed_rate=0.0, error_rate=0.0)
+    return parser.parse_args(argv)
+
+
+def _env(base_url, workdir, mode):
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "bench",
+        "LOG_LEVEL": "ERROR",
+        "STARTUP_MODE": mode,
+        "LLM_CACHE_TTL_TRADING": "0",
+        "MEMORY_DB": os.path.join(workdir, "memory.db"),
+        "CHECKPOINT_DB": os.path.join(workdir, "checkpoints.db"),
+        "REVIEW_DB": os.path.join(workdir, "reviews.db"),
+    })
+    return env
+
+
+def time_import(env):
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.check_output([sys.executable, "-c", code], env=env, text=True)
+    return float(out.strip().splitlines()[-1])
+
+
+def time_serve(env, symbol):
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = started + 60
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.perf_counter() > deadline or proc.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.01)
+        serve = time.perf_counter() - started
+
+        body = json.dumps({"symbol": symbol}).encode()
+        req = urllib.request.Request(
+            f"http://127.0.0.1:{port}/trade", data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        t = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+        first = time.perf_counter() - t
+        return serve, first
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _summary(values):
+    return {
+        "mean_ms": round(1000 * sum(values) / len(values), 1),
+        "p50_ms": round(1000 * percentile(values, 0.5), 1),
+        "max_ms": round(1000 * max(values), 1),
+    }
+
+
+def run(args, base_url):
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": [],
+    }
+    for mode in [m for m in args.modes.split(",") if m]:
+        imports, serves, firsts = [], [], []
+        for _ in range(args.runs):
+            # fresh stores each run, so the first request also pays schema creation
+            with tempfile.TemporaryDirectory() as workdir:
+                env = _env(base_url, workdir, mode)
+                imports.append(time_import(env))
+                serve, first = time_serve(env, args.symbol)
+                serves.append(serve)
+                firsts.append(first)
+        row = {
+            "mode": mode,
+            "import": _summary(imports),
+            "serve": _summary(serves),
+            "first_request": _summary(firsts),
+        }
+        report["results"].append(row)
+        print(
+            f"{mode:6} import={row['import']['p50_ms']:>7}ms serve={row['serve']['p50_ms']:>7}ms "
+            f"first={row['first_request']['p50_ms']:>7}ms",
+            file=sys.stderr,
+        )
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    proc, base_url = start_fake_server(args)
+    try:
+        report = run(args, base_url)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import uuid
-from engine.graph import app
+from engine.reviews import run_decision, stream_decision
+from engine.jobs import submit_job
+from engine.graph import deadline_for
 from engine.state import DecisionState
+from engine.singleflight import decisions, decision_key
 from domains.hiring.prompts import agent_a_prompt, agent_b_prompt
 
 
-def run_hiring_decision(candidate_profile: str):
-    state: DecisionState = {
+def _initial_state(candidate_profile: str) -> DecisionState:
+    return {
         "request_id": str(uuid.uuid4()),
         "domain": "hiring",
         "payload": {
@@ -19,6 +22,21 @@ def run_hiring_decision(candidate_profile: str):
         "trace": [],
         "a_attempts": 0,
         "b_attempts": 0,
+        "deadline": deadline_for("hiring"),
     }
 
-    return app.invoke(state)
+
+async def run_hiring_decision(candidate_profile: str):
+    state = _initial_state(candidate_profile)
+    return await decisions.do(decision_key(state), lambda: run_decision(state))
+
+
+def submit_hiring_job(candidate_profile: str) -> str:
+    """Queue a decision for engine.jobs; returns its request_id."""
+    return submit_job(_initial_state(candidate_profile))
+
+
+async def stream_hiring_events(candidate_profile: str):
+    """Yields (event, data) pairs as the graph progresses, see engine.reviews.stream_decision."""
+    async for event in stream_decision(_initial_state(candidate_profile)):
+        yield event
@@ -26,3 +26,40 @@ Return JSON:
   "reason": "short text"
 }}
 """
+
+
+def _packed_format(symbols: list[str]):
+    return ",\n".join(
+        f'  "{s}": {{"recommendation": "BUY | SELL | HOLD", "confidence": number between 0 and 1, "reason": "short text"}}'
+        for s in symbols
+    )
+
+
+def packed_agent_a_prompt(symbols: list[str]):
+    return f"""
+You are an optimistic trading analyst.
+
+Analyze each of these stocks independently based on general market trends:
+{", ".join(symbols)}
+
+Return one JSON object keyed by symbol:
+
+{{
+{_packed_format(symbols)}
+}}
+"""
+
+
+def packed_agent_b_prompt(symbols: list[str]):
+    return f"""
+You are a pessimistic trading analyst.
+
+Analyze risks for each of these stocks independently:
+{", ".join(symbols)}
+
+Return one JSON object keyed by symbol:
+
+{{
+{_packed_format(symbols)}
+}}
+"""
@@ -1,12 +1,37 @@
-from engine.graph import app
+import os
+import uuid
+import asyncio
+from engine.reviews import run_decision, stream_decision
+from engine.jobs import submit_job
+from engine.llm import call_llm_packed
+from engine.usage import new_usage
+from engine.graph import deadline_for
 from engine.state import DecisionState
-from domains.trading.prompts import agent_a_prompt, agent_b_prompt
+from engine.singleflight import decisions, decision_key
+from domains.trading.prompts import (
+    agent_a_prompt,
+    agent_b_prompt,
+    packed_agent_a_prompt,
+    packed_agent_b_prompt,
+)
 
+# max decisions in flight for one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
 
-def run_trading_decision(symbol: str):
+# per-symbol wall clock limit inside a batch, in seconds
+BATCH_SYMBOL_TIMEOUT = float(os.getenv("BATCH_SYMBOL_TIMEOUT", "60"))
+
+# symbols per packed LLM call in a batch; 1 sends one prompt per symbol
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", "1"))
+
+
+def _initial_state(symbol: str, prefill: dict = None) -> DecisionState:
     state: DecisionState = {
-        "request_id": str(symbol),
+        # unique per decision: it is also the checkpoint thread id
+        "request_id": str(uuid.uuid4()),
+        "domain": "trading",
         "payload": {
+            "symbol": symbol,
             "agent_a_prompt": agent_a_prompt(symbol),
             "agent_b_prompt": agent_b_prompt(symbol),
         },
@@ -17,7 +42,125 @@ def run_trading_decision(symbol: str):
         "trace": [],
         "a_attempts": 0,
         "b_attempts": 0,
+        "deadline": deadline_for("trading"),
     }
+    # signals from a packed call; a missing one means that agent asks on its own
+    for agent, signal in (prefill or {}).items():
+        if signal:
+            state["payload"][f"{agent}_prefill"] = signal
+    return state
 
-    result = app.invoke(state)
+
+async def run_trading_decision(symbol: str, prefill: dict = None):
+    state = _initial_state(symbol, prefill)
+    result = await decisions.do(decision_key(state), lambda: run_decision(state))
     return result
+
+
+def submit_trading_job(symbol: str) -> str:
+    """Queue a decision for engine.jobs; returns its request_id."""
+    return submit_job(_initial_state(symbol))
+
+
+async def stream_trading_events(symbol: str):
+    """Yields (event, data) pairs as the graph progresses, see engine.reviews.stream_decision."""
+    async for event in stream_decision(_initial_state(symbol)):
+        yield event
+
+
+async def _packed_signals(symbols: list[str], timeout: float):
+    """
+    {symbol: {"agent_a": signal or None, "agent_b": signal or None}} from
+    one packed call per agent. Token usage is split evenly over the symbols.
+    """
+    usage = {"agent_a": new_usage(), "agent_b": new_usage()}
+    answers = await asyncio.gather(
+        asyncio.wait_for(call_llm_packed(
+            packed_agent_a_prompt(symbols), symbols, "trading", agent="agent_a", usage=usage["agent_a"]
+        ), timeout),
+        asyncio.wait_for(call_llm_packed(
+            packed_agent_b_prompt(symbols), symbols, "trading", agent="agent_b", usage=usage["agent_b"]
+        ), timeout),
+        return_exceptions=True,
+    )
+
+    out = {s: {} for s in symbols}
+    for agent, answer in zip(("agent_a", "agent_b"), answers):
+        if isinstance(answer, BaseException):
+            continue
+        share = {k: v / len(symbols) for k, v in usage[agent].items()}
+        for symbol, signal in answer.items():
+            if signal:
+                out[symbol][agent] = {**signal, "usage": share}
+    return out
+
+
+async def stream_trading_decisions(
+    symbols: list[str],
+    concurrency: int = BATCH_CONCURRENCY,
+    timeout: float = BATCH_SYMBOL_TIMEOUT,
+    pack_size: int = BATCH_PACK_SIZE,
+):
+    """
+    Yields {"symbol", "result"} or {"symbol", "error"} per symbol in
+    completion order. A failing or timed out symbol yields an error entry
+    and never holds up the others. A symbol listed more than once is
+    evaluated once and its entry yielded once per listing, so there is
+    always one entry per input symbol.
+
+    With pack_size > 1 each group of pack_size symbols is first sent as
+    one packed prompt per agent; symbols the packed answer missed or
+    garbled fall back to their own calls inside the graph.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    finished = asyncio.Queue()
+
+    async def run_one(symbol, prefill=None):
+        async with sem:
+            try:
+                result = await asyncio.wait_for(run_trading_decision(symbol, prefill), timeout)
+                item = {"symbol": symbol, "result": result}
+            except asyncio.TimeoutError:
+                item = {"symbol": symbol, "error": f"timed out after {timeout}s"}
+            except Exception as e:
+                item = {"symbol": symbol, "error": str(e)}
+        await finished.put(item)
+
+    async def run_pack(pack):
+        async with sem:
+            prefills = await _packed_signals(pack, timeout)
+        await asyncio.gather(*(run_one(s, prefills[s]) for s in pack))
+
+    # the same symbol twice in one batch is the same question; one run answers all
+    # its listings (concurrent runs would be coalesced by single-flight anyway)
+    listings = {}
+    for s in symbols:
+        listings[s] = listings.get(s, 0) + 1
+    unique = list(listings)
+    if pack_size > 1:
+        tasks = [
+            asyncio.create_task(run_pack(unique[i:i + pack_size]))
+            for i in range(0, len(unique), pack_size)
+        ]
+    else:
+        tasks = [asyncio.create_task(run_one(s)) for s in unique]
+
+    try:
+        for _ in unique:
+            item = await finished.get()
+            for _ in range(listings[item["symbol"]]):
+                yield dict(item)
+    finally:
+        # consumer went away (e.g. client disconnected mid-stream)
+        for t in tasks:
+            t.cancel()
+
+
+async def run_trading_batch(
+    symbols: list[str],
+    concurrency: int = BATCH_CONCURRENCY,
+    timeout: float = BATCH_SYMBOL_TIMEOUT,
+    pack_size: int = BATCH_PACK_SIZE,
+):
+    return [r async for r in stream_trading_decisions(symbols, concurrency, timeout, pack_size)]
+
@@ -0,0 +1,140 @@
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(model: str, temperature: float, prompt: str) -> str:
+    digest = hashlib.sha256(prompt.encode()).hexdigest()
+    return f"{model}:{temperature}:{digest}"
+
+
+class LLMCache:
+    """
+    Two-tier response cache: a bounded in-memory LRU in front of an
+    optional SQLite file that survives restarts. Entries carry their own
+    expiry so each domain can use a different TTL; expired rows are
+    purged from the file every purge_interval seconds.
+
+    aget/aset are for the event loop: the LRU is consulted inline and
+    the file only from a worker thread.
+    """
+
+    def __init__(self, max_entries=1024, path=None, purge_interval=300.0):
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self._mem = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # separate, so a slow disk operation never holds up an LRU lookup
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._purged_at = 0.0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # a lost cache entry only costs a call; no fsync per store
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_expires ON llm_cache (expires_at)"
+            )
+            self._db.commit()
+
+        self.stats = {
+            "hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "purged": 0,
+        }
+
+    def get(self, key):
+        value = self._get_mem(key)
+        if value is None and self._db is not None:
+            value = self._get_disk(key)
+        if value is None:
+            self.stats["misses"] += 1
+        return value
+
+    async def aget(self, key):
+        value = self._get_mem(key)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key)
+        if value is None:
+            self.stats["misses"] += 1
+        return value
+
+    def set(self, key, value, ttl):
+        expires_at = self._set_mem(key, value, ttl)
+        if self._db is not None:
+            self._set_disk(key, value, expires_at)
+
+    async def aset(self, key, value, ttl):
+        expires_at = self._set_mem(key, value, ttl)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at)
+
+    def _get_mem(self, key):
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._mem.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            del self._mem[key]
+            return None
+
+    def _get_disk(self, key):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        value = json.loads(row[0])
+        with self._lock:
+            self._put_mem(key, row[1], value)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+        return value
+
+    def _set_mem(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put_mem(key, expires_at, value)
+            self.stats["stores"] += 1
+        return expires_at
+
+    def _set_disk(self, key, value, expires_at):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            if now - self._purged_at >= self.purge_interval:
+                self._purged_at = now
+                self.stats["purged"] += self._db.execute(
+                    "DELETE FROM llm_cache WHERE expires_at <= ?", (now,)
+                ).rowcount
+            self._db.commit()
+
+    def _put_mem(self, key, expires_at, value):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
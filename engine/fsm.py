@@ -0,0 +1,236 @@
+"""
+Table-driven state machine executor for the decision flow.
+
+The LangGraph graph in engine/graph.py is general: channels, supersteps,
+checkpoint plumbing on every step. The decision flow needs much less. It
+is a fixed table of states (node functions), transitions (fixed or
+routed), retry edges that point back at the same state, an optional
+fork into concurrent branches that meet at a join, and states to pause
+before for human review. Machine compiles that table into integer-indexed
+lookups once and runs it with one dict updated in place.
+
+It runs the same node and router functions as the graph and applies the
+same reducers, read from the DecisionState annotations. It speaks the
+subset of the compiled-graph API that engine.reviews uses (ainvoke,
+astream, aget_state, aupdate_state, checkpointer.adelete_thread), so
+either executor can serve a domain (see FSM_DOMAINS in engine/graph.py).
+
+Concurrent branches are not run in lockstep. A router sees the other
+branch's updates as soon as they land, as in the graph's agents_node.
+"""
+import asyncio
+import inspect
+import operator
+from types import SimpleNamespace
+from typing import get_type_hints, get_origin, get_args, Annotated
+
+END = "__end__"
+JOIN = "__join__"
+
+
+class Route:
+    """Conditional transition: router(state) -> key into targets."""
+
+    __slots__ = ("router", "targets")
+
+    def __init__(self, router, targets):
+        self.router = router
+        self.targets = targets
+
+
+def reducers_for(schema):
+    """{field: (reducer, empty value)} for Annotated[..., reducer] fields of a TypedDict."""
+    reducers = {}
+    for field, hint in get_type_hints(schema, include_extras=True).items():
+        if get_origin(hint) is Annotated:
+            base, reducer = get_args(hint)[:2]
+            reducers[field] = (reducer, get_origin(base) or base)
+    return reducers
+
+
+class StoreThreads:
+    """Paused machine runs kept in the shared store (engine.store), called off the loop."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def aget(self, thread_id):
+        return await asyncio.to_thread(self.store.load_thread, thread_id)
+
+    async def aput(self, thread_id, node, state):
+        await asyncio.to_thread(self.store.save_thread, thread_id, node, state)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.store.delete_thread, thread_id)
+
+
+class Machine:
+    """
+    nodes:        name -> fn(state) -> partial update (async, or sync run in a thread)
+    transitions:  name -> target name, END, JOIN or Route
+    start:        entry state, or a tuple of branch entries run concurrently
+                  until each reaches JOIN, then `join` runs
+    pause_before: states a run stops in front of when a checkpointer is set;
+                  resume with aupdate_state(...) + ainvoke(None, config)
+    """
+
+    def __init__(self, schema, nodes, transitions, start, join=None,
+                 pause_before=(), checkpointer=None):
+        self.checkpointer = checkpointer
+        self._names = list(nodes)
+        index = {name: i for i, name in enumerate(self._names)}
+        index[END] = -1
+        index[JOIN] = -2
+
+        def resolve(target, source):
+            if target not in index:
+                raise ValueError(f"{source!r} leads to unknown state {target!r}")
+            return index[target]
+
+        self._fns = [nodes[name] for name in self._names]
+        self._async = [inspect.iscoroutinefunction(fn) for fn in self._fns]
+        self._next = []
+        for name in self._names:
+            if name not in transitions:
+                raise ValueError(f"state {name!r} has no transition")
+            t = transitions[name]
+            if isinstance(t, Route):
+                self._next.append((t.router, {k: resolve(v, name) for k, v in t.targets.items()}))
+            else:
+                self._next.append(resolve(t, name))
+
+        if isinstance(start, tuple):
+            if join is None:
+                raise ValueError("a forked start needs a join state")
+            self._start = tuple(resolve(s, "start") for s in start)
+            self._join = resolve(join, "join")
+        else:
+            self._start = resolve(start, "start")
+            self._join = None
+        self._pause = frozenset(index[name] for name in pause_before)
+        self._reducers = reducers_for(schema)
+
+    # -- state --
+
+    def _initial(self, values):
+        state = dict(values)
+        for field, (reducer, empty) in self._reducers.items():
+            # own copies, so in-place reducers never touch the caller's lists
+            state[field] = reducer(empty(), state[field]) if field in state else empty()
+        return state
+
+    def _apply(self, state, update):
+        for key, value in update.items():
+            spec = self._reducers.get(key)
+            if spec is None:
+                state[key] = value
+            elif spec[0] is operator.add and isinstance(value, list):
+                # extend in place instead of copying the whole list
+                state[key].extend(value)
+            else:
+                state[key] = spec[0](state[key], value)
+
+    def _route(self, i, state):
+        nxt = self._next[i]
+        if type(nxt) is int:
+            return nxt
+        router, targets = nxt
+        return targets[router(state)]
+
+    # -- execution --
+
+    async def _step(self, i, state, emit):
+        if self._async[i]:
+            update = await self._fns[i](state)
+        else:
+            # in a worker thread, as LangGraph runs sync nodes: they may
+            # block (persist_memory waits when the writer queue is full)
+            update = await asyncio.to_thread(self._fns[i], state)
+        if update:
+            self._apply(state, update)
+        if emit is not None:
+            emit(self._names[i], update)
+        return self._route(i, state)
+
+    async def _branch(self, i, state, emit):
+        while i != -2:
+            if i == -1:
+                raise RuntimeError("branch ended before reaching the join")
+            i = await self._step(i, state, emit)
+
+    async def _run(self, i, state, thread_id, emit, resuming=False):
+        if i is None:
+            await asyncio.gather(*(self._branch(s, state, emit) for s in self._start))
+            i = self._join
+        while i != -1:
+            if i in self._pause and self.checkpointer is not None and not resuming:
+                await self.checkpointer.aput(thread_id, self._names[i], state)
+                return state
+            resuming = False
+            i = await self._step(i, state, emit)
+        return state
+
+    def _begin(self, values, config):
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        start = None if isinstance(self._start, tuple) else self._start
+        return self._initial(values), start, thread_id
+
+    async def _resume(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        saved = await self.checkpointer.aget(thread_id)
+        if saved is None:
+            raise KeyError(f"no paused run for thread {thread_id!r}")
+        node, state = saved
+        return state, self._names.index(node), thread_id
+
+    async def ainvoke(self, values, config=None, **kwargs):
+        """Run to the end or to a pause. values=None resumes a paused thread."""
+        if values is None:
+            state, i, thread_id = await self._resume(config)
+            return await self._run(i, state, thread_id, None, resuming=True)
+        state, i, thread_id = self._begin(values, config)
+        return await self._run(i, state, thread_id, None)
+
+    async def astream(self, values, config=None, stream_mode="updates", **kwargs):
+        """
+        Yields {node: update} per finished node ("updates"); with a list of
+        modes, (mode, chunk) pairs, ending in ("values", final state).
+        """
+        modes = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+        queue = asyncio.Queue()
+        if values is None:
+            state, i, thread_id = await self._resume(config)
+            run = self._run(i, state, thread_id, lambda n, u: queue.put_nowait({n: u}), resuming=True)
+        else:
+            state, i, thread_id = self._begin(values, config)
+            run = self._run(i, state, thread_id, lambda n, u: queue.put_nowait({n: u}))
+        task = asyncio.ensure_future(run)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                if "updates" in modes:
+                    yield chunk if len(modes) == 1 else ("updates", chunk)
+            final = task.result()
+            if "values" in modes:
+                yield final if len(modes) == 1 else ("values", final)
+        finally:
+            task.cancel()
+
+    async def aget_state(self, config):
+        saved = await self.checkpointer.aget(config["configurable"]["thread_id"])
+        if saved is None:
+            return SimpleNamespace(values={}, next=())
+        node, state = saved
+        return SimpleNamespace(values=state, next=(node,))
+
+    async def aupdate_state(self, config, values, as_node):
+        """Apply values as if as_node had returned them and re-route from there."""
+        state, _, thread_id = await self._resume(config)
+        self._apply(state, values)
+        i = self._route(self._names.index(as_node), state)
+        if i < 0:
+            raise ValueError(f"update as {as_node!r} leaves nothing to resume")
+        await self.checkpointer.aput(thread_id, self._names[i], state)
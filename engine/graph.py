@@ -1,108 +1,216 @@
+import os
 import time
-from typing_extensions import Annotated
-from typing import Optional, Literal
-from uuid import uuid4
-
-from langgraph.graph import StateGraph
-from langgraph.channels import LastValue, Topic
-
-from engine.state import DecisionState, Signal
+import random
+import asyncio
+import contextlib
+from engine.state import DecisionState
 from engine.logging import log_event
-from engine.llm import call_llm
+from engine.llm import call_llm, get_client
 from engine.memory import write_memory
+from engine.metrics import timed_node, agent_retries, recommendations
+from engine.usage import new_usage, rollup, merge_usage
+from engine.store import load_object, store
+from engine.fsm import Machine, Route, StoreThreads, END, JOIN
 
 MAX_RETRIES = 2
 
+# "parallel" or "sequential", see build_graph
+GRAPH_MODE = os.getenv("GRAPH_MODE", "parallel")
+
+# domains that always want both signals recorded, even when one of them
+# can no longer change the outcome (see outcome_forced)
+FULL_EVALUATION_DOMAINS = set(filter(None, os.getenv("FULL_EVALUATION_DOMAINS", "").split(",")))
+
+# consensus below this min confidence goes to human review instead of
+# being acted on; 0 acts on every agreement. Tune with engine.replay.
+AUTO_ACTION_THRESHOLD = float(os.getenv("AUTO_ACTION_THRESHOLD", "0"))
+
+# domains run on the table-driven executor (build_machine) instead of LangGraph
+FSM_DOMAINS = set(filter(None, os.getenv("FSM_DOMAINS", "").split(",")))
+
+# durable store for threads paused at human review: "sqlite" (CHECKPOINT_DB,
+# shared by the workers on one host) or "package.module:factory" for a
+# networked saver, see _open_checkpointer
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.db")
+
 # -------------------------
-# Agent A (generic)
+# Deadline budget
 # -------------------------
-def agent_a_node(state: DecisionState):
-    attempt = state["a_attempts"] + 1
-    log_event(state, "agent_a_call")
+# wall-clock budget for one decision, per domain (seconds)
+DEADLINE_BUDGETS = {
+    "trading": float(os.getenv("DEADLINE_TRADING", "20")),
+    "hiring": float(os.getenv("DEADLINE_HIRING", "45")),
+}
+DEFAULT_DEADLINE_BUDGET = 30.0
 
-    try:
-        prompt = state["payload"]["agent_a_prompt"]
-        data = call_llm(prompt)
+# upper bound for a single LLM attempt, however much budget is left
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
 
-        signal = {
-            "recommendation": data["recommendation"],
-            "confidence": float(data["confidence"]),
-            "reason": data.get("reason")
-        }
+# don't start an attempt with less than this left
+MIN_ATTEMPT_SECONDS = 1.0
+
+# full-jitter exponential backoff between attempts
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+
+def deadline_for(domain: str) -> float:
+    return time.time() + DEADLINE_BUDGETS.get(domain, DEFAULT_DEADLINE_BUDGET)
+
+def remaining_budget(state: DecisionState) -> float:
+    deadline = state.get("deadline")
+    if deadline is None:
+        return float("inf")
+    return deadline - time.time()
 
-        log_event(state, "agent_a_result", signal)
+def has_budget(state: DecisionState) -> bool:
+    return remaining_budget(state) >= MIN_ATTEMPT_SECONDS
 
+def backoff_delay(attempt: int) -> float:
+    # attempt 2 waits up to BACKOFF_BASE, attempt 3 up to 2x, ...
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 2)))
+
+# -------------------------
+# Agents (generic)
+# -------------------------
+async def _agent_node(state: DecisionState, agent: str):
+    name = f"agent_{agent}"
+    attempts_key = f"{agent}_attempts"
+    attempt = state[attempts_key] + 1
+
+    prefill = state["payload"].get(f"{name}_prefill")
+    if attempt == 1 and prefill:
+        # already answered by a packed multi-symbol call (call_llm_packed)
+        log_event(state, f"{name}_result", prefill)
         return {
-            "agent_a": signal,
-            "a_attempts": attempt,
-            "trace": [f"agent_a_attempt_{attempt}"]
+            name: prefill,
+            attempts_key: attempt,
+            "usage": {name: prefill.get("usage") or new_usage()},
+            "trace": [f"{name}_packed"]
         }
-    except Exception as e:
-        log_event(state, "agent_a_failed", str(e))
+
+    if not has_budget(state):
+        log_event(state, f"{name}_deadline_exceeded")
         return {
-            "agent_a": None,
-            "a_attempts": attempt,
-            "trace": [f"agent_a_failed_{attempt}"]
+            name: None,
+            "trace": [f"{name}_deadline_exceeded"]
         }
 
+    if attempt > 1:
+        agent_retries.inc(name, state["domain"])
+        # never sleep into the time reserved for the attempt itself
+        delay = min(backoff_delay(attempt), remaining_budget(state) - MIN_ATTEMPT_SECONDS)
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-# -------------------------
-# Agent B (generic)
-# -------------------------
-def agent_b_node(state: DecisionState):
-    attempt = state["b_attempts"] + 1
-    log_event(state, "agent_b_call")
+    log_event(state, f"{name}_call")
 
+    usage = new_usage()
     try:
-        prompt = state["payload"]["agent_b_prompt"]
-        data = call_llm(prompt)
+        prompt = state["payload"][f"{name}_prompt"]
+        timeout = min(LLM_TIMEOUT, remaining_budget(state))
+        data = await call_llm(
+            prompt, state["domain"], timeout=timeout, agent=name, usage=usage, attempt=attempt
+        )
 
-        signal = {
-            "recommendation": data["recommendation"],
-            "confidence": float(data["confidence"]),
-            "reason": data.get("reason")
-        }
+        # call_llm has already validated the recommendation and confidence
+        signal = {**data, "usage": usage}
 
-        log_event(state, "agent_b_result", signal)
+        log_event(state, f"{name}_result", signal)
 
         return {
-            "agent_b": signal,
-            "b_attempts": attempt,
-            "trace": [f"agent_b_attempt_{attempt}"]
+            name: signal,
+            attempts_key: attempt,
+            "usage": {name: usage},
+            "trace": [f"{name}_attempt_{attempt}"]
         }
     except Exception as e:
-        log_event(state, "agent_b_failed", str(e))
+        log_event(state, f"{name}_failed", str(e))
+        trace = [f"{name}_failed_{attempt}"]
+        if attempt <= MAX_RETRIES and not has_budget(state):
+            # the router will stop retrying; record why
+            trace.append(f"{name}_deadline_exceeded")
         return {
-            "agent_b": None,
-            "b_attempts": attempt,
-            "trace": [f"agent_b_failed_{attempt}"]
+            name: None,
+            attempts_key: attempt,
+            "usage": {name: usage},
+            "trace": trace
         }
 
 
+async def agent_a_node(state: DecisionState):
+    return await _agent_node(state, "a")
+
+
+async def agent_b_node(state: DecisionState):
+    return await _agent_node(state, "b")
+
+
 # -------------------------
 # Human Review Node
 # -------------------------
 def human_review_node(state: DecisionState):
-    # system pauses here
-    log_event(state, "human_review_required")
+    # with a checkpointer the graph pauses *before* this node and only
+    # reaches it once a reviewer has resumed the thread (engine/reviews.py)
+    log_event(state, "human_review", state.get("human_override"))
 
-    return {
-        "trace": ["human_review"]
-    }
+    update = {"trace": ["human_review"]}
+    if state.get("human_override"):
+        update["final_recommendation"] = state["human_override"]
+    return update
 
 # -------------------------
 # Retry routers
 # -------------------------
+def settled_missing(state: DecisionState, agent: str) -> bool:
+    # no signal and no further attempt coming
+    return state[f"agent_{agent}"] is None and (
+        state[f"{agent}_attempts"] > MAX_RETRIES or not has_budget(state)
+    )
+
+def outcome_forced(state: DecisionState, agent: str) -> bool:
+    """
+    True when this agent's signal can no longer change the outcome: the
+    other agent is missing for good, so aggregate will return REVIEW.
+    """
+    if state["domain"] in FULL_EVALUATION_DOMAINS:
+        return False
+    other = "b" if agent == "a" else "a"
+    return settled_missing(state, other)
+
 def agent_a_router(state: DecisionState):
-    if state["agent_a"] is None and state["a_attempts"] <= MAX_RETRIES:
-        return "RETRY"
+    if state["agent_a"] is None and state["a_attempts"] <= MAX_RETRIES and has_budget(state):
+        return "SKIP" if outcome_forced(state, "a") else "RETRY"
     return "DONE"
 
 def agent_b_router(state: DecisionState):
-    if state["agent_b"] is None and state["b_attempts"] <= MAX_RETRIES:
-        return "RETRY"
+    if state["agent_b"] is None and state["b_attempts"] <= MAX_RETRIES and has_budget(state):
+        return "SKIP" if outcome_forced(state, "b") else "RETRY"
     return "DONE"
 
+def sequential_a_router(state: DecisionState):
+    # agent_b has not run yet, so it can be skipped entirely
+    route = agent_a_router(state)
+    if route == "DONE" and outcome_forced(state, "b"):
+        return "SKIP_B"
+    return route
+
+# -------------------------
+# Short-circuit
+# -------------------------
+def _skipped_node(state: DecisionState, agent: str):
+    name = f"agent_{agent}"
+    # calls that would still have been made: remaining retries, or all of them
+    skipped = MAX_RETRIES + 1 - state[f"{agent}_attempts"]
+    log_event(state, f"{name}_skipped", {"skipped_calls": skipped})
+    return {"trace": [f"{name}_skipped_{skipped}"]}
+
+def agent_a_skipped_node(state: DecisionState):
+    return _skipped_node(state, "a")
+
+def agent_b_skipped_node(state: DecisionState):
+    return _skipped_node(state, "b")
+
 # -------------------------
 # Policy router
 # -------------------------
@@ -122,12 +230,14 @@ def aggregate_node(state: DecisionState):
         final = "REVIEW"
         conf = 0.0
     elif a["recommendation"] == b["recommendation"]:
-        final = a["recommendation"]
         conf = min(a["confidence"], b["confidence"])
+        final = a["recommendation"] if conf >= AUTO_ACTION_THRESHOLD else "REVIEW"
     else:
         final = "REVIEW"
         conf = min(a["confidence"], b["confidence"])
 
+    recommendations.inc(state["domain"], final)
+
     log_event(state, "aggregate", {
         "final": final,
         "confidence": conf
@@ -152,46 +262,268 @@ def persist_memory_node(state: DecisionState):
         "final_recommendation": state["final_recommendation"],
         "final_confidence": state["final_confidence"],
         "human_override": state.get("human_override"),
+        "usage": rollup(state.get("usage") or {}),
         "timestamp": time.time()
     }
+    # only enqueues; the background writer does the disk I/O
     write_memory(record)
     return {"trace": ["memory_written"]}
 
 # -------------------------
-# Graph definition
+# Both retry loops in one step (parallel mode)
 # -------------------------
-graph = StateGraph(DecisionState)
-
-graph.add_node("agent_a", agent_a_node)
-graph.add_node("agent_b", agent_b_node)
-graph.add_node("aggregate", aggregate_node)
-graph.add_node("human", human_review_node)
+_agent_nodes = {
+    "a": (timed_node("agent_a", agent_a_node), agent_a_router, agent_a_skipped_node),
+    "b": (timed_node("agent_b", agent_b_node), agent_b_router, agent_b_skipped_node),
+}
+
+async def _agent_loop(view, update, agent, emit):
+    node, router, skipped = _agent_nodes[agent]
+    name = f"agent_{agent}"
+    while True:
+        step = await node(view)
+        emit({name: step})
+        for key, value in step.items():
+            if key == "trace":
+                update["trace"] += value
+            elif key == "usage":
+                update["usage"] = merge_usage(update["usage"], value)
+            else:
+                # routers read these, the other agent's included
+                view[key] = update[key] = value
+        route = router(view)
+        if route == "RETRY":
+            continue
+        if route == "SKIP":
+            step = skipped(view)
+            emit({f"{name}_skipped": step})
+            update["trace"] += step["trace"]
+        return
+
+async def agents_node(state: DecisionState):
+    """
+    agent_a's and agent_b's retry loops run concurrently in this one
+    node, so a retry of one never waits for the other's attempt to end
+    the superstep. They share one view of the state, so each router sees
+    the other agent's progress as soon as it lands (as in engine.fsm).
+
+    Each attempt is also written to the "custom" stream as
+    {"agent_a": update} the moment it finishes, in the shape the
+    per-agent nodes of the sequential graph produce under "updates";
+    this node's own update only arrives once both agents have settled.
+    """
+    from langgraph.config import get_stream_writer
+
+    emit = get_stream_writer()
+    view = dict(state)
+    update = {"trace": [], "usage": {}}
+    await asyncio.gather(
+        _agent_loop(view, update, "a", emit), _agent_loop(view, update, "b", emit)
+    )
+    return update
 
-graph.set_entry_point("agent_a")
-
-graph.add_edge("agent_a", "agent_b")
-
-graph.add_conditional_edges(
-    "agent_a",
-    agent_a_router,
-    {"RETRY": "agent_a", "DONE": "agent_b"}
-)
-
-graph.add_conditional_edges(
-    "agent_b",
-    agent_b_router,
-    {"RETRY": "agent_b", "DONE": "aggregate"}
-)
-
-graph.add_conditional_edges(
-    "aggregate",
-    policy_router,
-    {
-        "HUMAN": "human",
-        "DONE": "__end__"
+# -------------------------
+# Graph definition
+# -------------------------
+def build_graph(mode: str = GRAPH_MODE, checkpointer=None):
+    """
+    "parallel": agent_a and agent_b, each with its whole retry loop, run
+    side by side in one node (agents_node); aggregate follows once both
+    have settled.
+    "sequential": agent_a -> agent_b -> aggregate.
+
+    With a checkpointer the graph interrupts before "human" so a review
+    can be resumed later from the saved state.
+    """
+    # langgraph is a heavy import; deferred until a graph is actually built
+    from langgraph.graph import StateGraph, START, END
+
+    graph = StateGraph(DecisionState)
+
+    graph.add_node("aggregate", timed_node("aggregate", aggregate_node))
+    graph.add_node("human", timed_node("human", human_review_node))
+    graph.add_node("persist_memory", timed_node("persist_memory", persist_memory_node))
+
+    if mode == "parallel":
+        graph.add_node("agents", agents_node)
+        graph.add_edge(START, "agents")
+        graph.add_edge("agents", "aggregate")
+    elif mode == "sequential":
+        graph.add_node("agent_a", timed_node("agent_a", agent_a_node))
+        graph.add_node("agent_b", timed_node("agent_b", agent_b_node))
+        graph.add_node("agent_a_skipped", agent_a_skipped_node)
+        graph.add_node("agent_b_skipped", agent_b_skipped_node)
+
+        graph.set_entry_point("agent_a")
+
+        graph.add_conditional_edges(
+            "agent_a",
+            sequential_a_router,
+            {
+                "RETRY": "agent_a",
+                "SKIP": "agent_a_skipped",
+                "SKIP_B": "agent_b_skipped",
+                "DONE": "agent_b"
+            }
+        )
+
+        graph.add_conditional_edges(
+            "agent_b",
+            agent_b_router,
+            {"RETRY": "agent_b", "SKIP": "agent_b_skipped", "DONE": "aggregate"}
+        )
+
+        graph.add_edge("agent_a_skipped", "agent_b")
+        graph.add_edge("agent_b_skipped", "aggregate")
+    else:
+        raise ValueError(f"unknown graph mode {mode!r}")
+
+    graph.add_conditional_edges(
+        "aggregate",
+        policy_router,
+        {
+            "HUMAN": "human",
+            "DONE": "persist_memory"
+        }
+    )
+
+    graph.add_edge("human", "persist_memory")
+    graph.add_edge("persist_memory", END)
+
+    if checkpointer is None:
+        return graph.compile()
+    return graph.compile(checkpointer=checkpointer, interrupt_before=["human"])
+
+
+def build_machine(mode: str = GRAPH_MODE, checkpointer=None):
+    """
+    The same flow as build_graph, as a table for engine.fsm.Machine:
+    same nodes, routers and retry edges, same pause before "human" when
+    a checkpointer (engine.fsm.StoreThreads) is given.
+    """
+    nodes = {
+        "agent_a": timed_node("agent_a", agent_a_node),
+        "agent_b": timed_node("agent_b", agent_b_node),
+        "agent_a_skipped": agent_a_skipped_node,
+        "agent_b_skipped": agent_b_skipped_node,
+        "aggregate": timed_node("aggregate", aggregate_node),
+        "human": timed_node("human", human_review_node),
+        "persist_memory": timed_node("persist_memory", persist_memory_node),
+    }
+    transitions = {
+        "aggregate": Route(policy_router, {"HUMAN": "human", "DONE": "persist_memory"}),
+        "human": "persist_memory",
+        "persist_memory": END,
     }
-)
-
-graph.set_finish_point("aggregate")
 
-app = graph.compile()
+    if mode == "parallel":
+        # each agent's retry loop is a branch; aggregate runs once both reach JOIN
+        start, join = ("agent_a", "agent_b"), "aggregate"
+        transitions.update({
+            "agent_a": Route(agent_a_router, {"RETRY": "agent_a", "SKIP": "agent_a_skipped", "DONE": JOIN}),
+            "agent_b": Route(agent_b_router, {"RETRY": "agent_b", "SKIP": "agent_b_skipped", "DONE": JOIN}),
+            "agent_a_skipped": JOIN,
+            "agent_b_skipped": JOIN,
+        })
+    elif mode == "sequential":
+        start, join = "agent_a", None
+        transitions.update({
+            "agent_a": Route(sequential_a_router, {
+                "RETRY": "agent_a",
+                "SKIP": "agent_a_skipped",
+                "SKIP_B": "agent_b_skipped",
+                "DONE": "agent_b",
+            }),
+            "agent_b": Route(agent_b_router, {"RETRY": "agent_b", "SKIP": "agent_b_skipped", "DONE": "aggregate"}),
+            "agent_a_skipped": "agent_b",
+            "agent_b_skipped": "aggregate",
+        })
+    else:
+        raise ValueError(f"unknown graph mode {mode!r}")
+
+    return Machine(
+        DecisionState, nodes, transitions, start, join,
+        pause_before=("human",), checkpointer=checkpointer,
+    )
+
+
+_app = None
+
+def __getattr__(name):
+    # engine.graph.app is compiled on first access rather than at import
+    global _app
+    if name == "app":
+        if _app is None:
+            # no checkpointer: runs straight through human review, for scripts/benchmarks
+            _app = build_graph()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_durable = None  # (event loop, compiled graph, exit stack of a plugged-in saver)
+_machine = None
+
+async def _open_checkpointer():
+    if CHECKPOINTER == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        conn = aiosqlite.connect(CHECKPOINT_DB)
+        # a daemon, so a script that never calls close_app() can still exit
+        # (older aiosqlite: the connection is itself the thread)
+        getattr(conn, "_thread", conn).daemon = True
+        return AsyncSqliteSaver(conn), None
+    # a factory returning an async context manager that yields a saver,
+    # the shape of LangGraph's own Async*Saver.from_conn_string
+    stack = contextlib.AsyncExitStack()
+    saver = await stack.enter_async_context(load_object(CHECKPOINTER)())
+    return saver, stack
+
+async def get_app(domain: str = None):
+    """
+    Durable executor for domain: the compiled FSM for FSM_DOMAINS, else
+    the graph compiled with the checkpointer. The saver's connection is
+    bound to the running event loop, so it is built on first use there.
+    """
+    global _durable, _machine
+    if domain in FSM_DOMAINS:
+        if _machine is None:
+            _machine = build_machine(checkpointer=StoreThreads(store))
+        return _machine
+    loop = asyncio.get_running_loop()
+    if _durable is None or _durable[0] is not loop:
+        await close_app()
+        saver, stack = await _open_checkpointer()
+        _durable = (loop, build_graph(checkpointer=saver), stack)
+    return _durable[1]
+
+async def close_app():
+    """Close the checkpointer's connection, e.g. on shutdown or before the loop goes away."""
+    global _durable
+    if _durable is not None:
+        loop, graph, stack = _durable
+        _durable = None
+        if loop is not asyncio.get_running_loop():
+            # built on a loop that is gone, nothing left to await on
+            conn = getattr(graph.checkpointer, "conn", None)
+            if hasattr(conn, "stop"):
+                conn.stop()
+        elif stack is not None:
+            await stack.aclose()
+        else:
+            await graph.checkpointer.conn.close()
+
+def _import_heavy():
+    import openai  # noqa: F401
+    import aiosqlite  # noqa: F401
+    import langgraph.graph  # noqa: F401
+    import langgraph.checkpoint.sqlite.aio  # noqa: F401
+
+async def warm_up():
+    """
+    Do the expensive first-use work ahead of the first request: imports
+    in a worker thread so the loop keeps serving, then the durable graph
+    and the LLM client.
+    """
+    await asyncio.to_thread(_import_heavy)
+    await get_app()
+    get_client()
@@ -0,0 +1,191 @@
+"""
+Job mode: submit a decision, get its request_id back at once, poll later.
+
+Jobs are queued in the shared store (engine.store), and a bounded pool of
+runners claims them one at a time. With JOB_RUNNER=inline (default)
+every API process runs a pool next to its request handlers; with
+JOB_RUNNER=external the API only enqueues and a separate process runs
+the pool:
+
+    python -m engine.jobs
+
+Either way a job submitted to one uvicorn worker can be run by another,
+and GET /jobs/{id} answers from any of them.
+"""
+import os
+import asyncio
+
+from engine.graph import deadline_for, policy_router, close_app
+from engine.logging import log_event
+from engine.memory import writer, MemoryWriteError
+from engine.reviews import run_decision
+from engine.store import store
+
+# "inline" or "external", see module docstring
+JOB_RUNNER = os.getenv("JOB_RUNNER", "inline")
+# decisions run concurrently per pool
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+# submissions are refused once this many jobs are waiting
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "10000"))
+# idle runners look for jobs submitted elsewhere this often (seconds)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# a running job whose runner has not renewed its claim for this long is
+# presumed dead (crashed, OOM-killed) and queued again (seconds)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# log_event fields for pool events that belong to no single decision
+_POOL = {"request_id": None, "domain": None, "a_attempts": 0, "b_attempts": 0}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobPool:
+    """Runners claiming jobs from the store; at most `workers` decisions at a time."""
+
+    def __init__(self, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL,
+                 lease=JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._tasks = []
+        self._wake = None
+        self._loop = None
+        self.stats = {
+            "started": 0, "done": 0, "review": 0, "failed": 0, "running": 0,
+            "requeued": 0, "errors": 0,
+        }
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._runner()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        # a job was submitted in this process; don't wait for the next poll.
+        # Sync handlers call this from the threadpool, so hop onto the loop.
+        if self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _runner(self):
+        while True:
+            try:
+                state = await asyncio.to_thread(store.claim_job)
+                if state is None:
+                    # jobs of runners that died mid-run go back on the queue
+                    self.stats["requeued"] += await asyncio.to_thread(store.requeue_stale_jobs, self.lease)
+                    await self._idle()
+                    continue
+                await self._run(state)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. "database is locked" under contention; the runner must survive it
+                self.stats["errors"] += 1
+                log_event(_POOL, "job_runner_error", repr(e), level="ERROR")
+                await self._idle()
+
+    async def _renew(self, request_id):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(store.renew_job, request_id)
+            except Exception as e:
+                log_event(_POOL, "job_renew_failed", repr(e), level="WARNING")
+
+    async def _run(self, state):
+        # the deadline budget starts when the job does, not when it was queued
+        state["deadline"] = deadline_for(state["domain"])
+        self.stats["started"] += 1
+        self.stats["running"] += 1
+        renew = asyncio.create_task(self._renew(state["request_id"]))
+        try:
+            result = await run_decision(state)
+        except asyncio.CancelledError:
+            # shutting down mid-run; nothing was checkpointed yet, so run it again later.
+            # Called inline: the task is already cancelled and may not get to await.
+            store.finish_job(state["request_id"], "queued")
+            raise
+        except Exception as e:
+            log_event(state, "job_failed", str(e))
+            self.stats["failed"] += 1
+            await asyncio.to_thread(store.finish_job, state["request_id"], "failed", str(e))
+            return
+        finally:
+            renew.cancel()
+            self.stats["running"] -= 1
+
+        if policy_router(result) == "HUMAN":
+            status = "review"
+        else:
+            status = "done"
+            # the record must be readable before the job says it is done
+            try:
+                await asyncio.to_thread(writer.flush)
+            except MemoryWriteError as e:
+                log_event(state, "job_failed", str(e))
+                self.stats["failed"] += 1
+                await asyncio.to_thread(store.finish_job, state["request_id"], "failed", str(e))
+                return
+        self.stats[status] += 1
+        await asyncio.to_thread(store.finish_job, state["request_id"], status)
+
+
+pool = JobPool()
+
+
+def submit_job(state):
+    """Queue a decision; returns its request_id. Raises JobQueueFull."""
+    if store.count_jobs("queued") >= JOB_QUEUE_LIMIT:
+        raise JobQueueFull(f"{JOB_QUEUE_LIMIT} jobs already queued")
+    store.add_job(state)
+    pool.notify()
+    return state["request_id"]
+
+
+def job_status(request_id):
+    """
+    The job's status, plus the persisted decision record once there is
+    one. A job paused for review turns "done" when the override lands.
+    """
+    job = store.get_job(request_id)
+    if job is None:
+        return None
+    if job["status"] in ("done", "review"):
+        record = store.get_decision(request_id)
+        if record is not None:
+            job["status"] = "done"
+            job["result"] = record
+    return job
+
+
+async def serve():
+    pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await close_app()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
@@ -1,19 +1,295 @@
 import os
-import json
-from openai import OpenAI
+import time
+import asyncio
+from collections import deque
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from engine.cache import LLMCache, cache_key
+from engine.metrics import llm_latency, llm_errors, llm_tokens, llm_cost
+from engine.usage import usage_from_response, add_usage
+from engine.ratelimit import RateLimiter, AdmissionShed, estimate_tokens
+from engine.parsing import signal_schema, parse_signal, packed_signal_schema, parse_packed
 
-def call_llm(prompt: str) -> dict:
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
+# built on first use (get_client) so importing the engine stays cheap
+client = None
 
-    raw = resp.choices[0].message.content
+def get_client():
+    global client
+    if client is None:
+        # openai is a heavy import; keep it off the cold-start path
+        from openai import AsyncOpenAI
 
-    # strip markdown if present
-    raw = raw.replace("```json", "").replace("```", "").strip()
+        # retries are driven by the graph routers within the deadline
+        # budget, so the SDK must not retry on its own
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return client
 
-    return json.loads(raw)
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.3
+
+# ask for Signal-shaped JSON via response_format (engine.parsing.signal_schema)
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") == "1"
+
+# seconds a parsed response stays valid, per domain; 0 or missing disables caching
+CACHE_TTLS = {
+    "trading": float(os.getenv("LLM_CACHE_TTL_TRADING", "300")),
+    "hiring": float(os.getenv("LLM_CACHE_TTL_HIRING", "3600")),
+}
+
+cache = LLMCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    path=os.getenv("LLM_CACHE_PATH"),  # unset keeps the cache in memory only
+)
+
+# client-side admission control, per model; 0 leaves a dimension unlimited.
+# LLM_RPM/LLM_TPM are the account-wide budget: set them just under the
+# account's limits so bursts queue here instead of coming back as 429s.
+# The buckets live in each process, so every process gets an equal share;
+# LLM_RATE_PROCESSES is how many share the account (uvicorn workers plus
+# any `python -m engine.jobs` runners), defaulting to WEB_CONCURRENCY.
+LLM_RATE_PROCESSES = max(1, int(os.getenv("LLM_RATE_PROCESSES", os.getenv("WEB_CONCURRENCY", "1"))))
+
+def _share(limit):
+    return max(1, limit // LLM_RATE_PROCESSES) if limit else 0
+
+RATE_LIMITS = {
+    MODEL: (_share(int(os.getenv("LLM_RPM", "0"))), _share(int(os.getenv("LLM_TPM", "0")))),
+}
+# completion tokens reserved per answer until the billed count is known
+COMPLETION_TOKEN_ESTIMATE = 120
+# a call must be able to run at least this long once admitted (seconds)
+MIN_RUN_SECONDS = 1.0
+
+limiters = {model: RateLimiter(model, rpm, tpm) for model, (rpm, tpm) in RATE_LIMITS.items()}
+
+# hedged requests (opt-in): if a call is slower than this percentile of
+# recent latencies, send a second identical one and take the first valid answer
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# at most this fraction of calls may fire a hedge
+HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.05"))
+# no hedging until this many latencies have been observed
+HEDGE_MIN_SAMPLES = 50
+
+
+class HedgePolicy:
+    """Tracks recent call latencies and decides when a hedge may fire."""
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, max_rate=HEDGE_MAX_RATE, window=1000):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self._latencies = deque(maxlen=window)
+        self._observed = 0
+        self._threshold = None
+        self.stats = {"calls": 0, "fired": 0, "won": 0, "capped": 0}
+
+    def observe(self, seconds):
+        self._latencies.append(seconds)
+        self._observed += 1
+        # re-sorting the window on every call is wasted work; counted
+        # separately because a full window's len() no longer moves
+        if self._observed % 20 == 0:
+            ordered = sorted(self._latencies)
+            self._threshold = ordered[int(self.percentile * (len(ordered) - 1))]
+
+    def delay(self):
+        """Seconds to wait before hedging, or None if hedging is off for now."""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return self._threshold
+
+    def allow(self):
+        if self.stats["fired"] + 1 > self.max_rate * self.stats["calls"]:
+            self.stats["capped"] += 1
+            return False
+        self.stats["fired"] += 1
+        return True
+
+
+hedge = HedgePolicy()
+
+
+def _record_usage(resp, domain, agent, usage):
+    u = usage_from_response(MODEL, resp)
+    for kind in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+        llm_tokens.inc(domain, agent, MODEL, kind, amount=u[kind])
+    llm_cost.inc(domain, agent, MODEL, amount=u["cost_usd"])
+    if usage is not None:
+        usage.update(add_usage(usage, u))
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def _complete(prompt: str, domain: str, timeout: float, agent: str,
+                    usage: dict, response_format: dict = None, attempt: int = 1,
+                    answers: int = 1, on_sent=None) -> str:
+    limiter = limiters[MODEL]
+    reserved = estimate_tokens(prompt, COMPLETION_TOKEN_ESTIMATE * answers)
+    deadline = None if timeout is None else time.monotonic() + timeout - MIN_RUN_SECONDS
+    waited = await limiter.acquire(reserved, domain, attempt, deadline)
+    if timeout is not None:
+        # time spent queued comes out of this attempt's budget
+        timeout -= waited
+
+    started = time.monotonic()
+    if on_sent is not None:
+        # admitted; the request goes out now
+        on_sent(started)
+    extra = {"response_format": response_format} if response_format else {}
+    try:
+        resp = await get_client().chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            timeout=timeout,
+            **extra
+        )
+    except Exception as exc:
+        if getattr(exc, "status_code", None) == 429:
+            limiter.rate_limited(_retry_after(exc))
+        raise
+    llm_latency.observe(time.monotonic() - started, MODEL, domain)
+    # billed even if the content turns out to be unusable
+    _record_usage(resp, domain, agent, usage)
+    if resp.usage is not None:
+        limiter.settle(reserved, resp.usage.total_tokens)
+    return resp.choices[0].message.content
+
+
+async def _request(prompt: str, domain: str = None, timeout: float = None,
+                   agent: str = None, usage: dict = None, attempt: int = 1,
+                   sent: asyncio.Event = None) -> dict:
+    # hedge latencies run from sending, not from queueing for admission
+    started = None
+
+    def on_sent(now):
+        nonlocal started
+        started = now
+        if sent is not None:
+            sent.set()
+
+    try:
+        raw = await _complete(
+            prompt, domain, timeout, agent, usage,
+            signal_schema(domain) if STRUCTURED_OUTPUT else None,
+            attempt, on_sent=on_sent,
+        )
+    except asyncio.CancelledError:
+        # a hedge race's loser took at least this long; leaving it out
+        # would drop exactly the slow calls from the window
+        if started is not None:
+            hedge.observe(time.monotonic() - started)
+        raise
+    hedge.observe(time.monotonic() - started)
+    return parse_signal(raw, domain)
+
+
+async def _hedged_request(prompt: str, domain: str = None, timeout: float = None,
+                         agent: str = None, usage: dict = None, attempt: int = 1) -> dict:
+    hedge.stats["calls"] += 1
+    started = time.monotonic()
+    sent = asyncio.Event()
+    primary = asyncio.ensure_future(_request(prompt, domain, timeout, agent, usage, attempt, sent))
+    tasks = {primary}
+    try:
+        delay = hedge.delay()
+        if delay is None:
+            return await primary
+
+        # the hedge timer starts once the primary is on the wire, never
+        # while it is still queued for admission
+        on_wire = asyncio.ensure_future(sent.wait())
+        try:
+            await asyncio.wait({primary, on_wire}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            on_wire.cancel()
+        if not primary.done():
+            await asyncio.wait(tasks, timeout=delay)
+        if not primary.done() and hedge.allow():
+            remaining = None if timeout is None else timeout - (time.monotonic() - started)
+            # queued like a retry, behind first attempts
+            tasks.add(asyncio.ensure_future(
+                _request(prompt, domain, remaining, agent, usage, attempt + 1)
+            ))
+
+        # first usable answer wins; an error or unparseable answer waits for the other
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task is not primary:
+                    hedge.stats["won"] += 1
+                return task.result()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_llm(prompt: str, domain: str = None, timeout: float = None,
+                   agent: str = None, usage: dict = None, attempt: int = 1) -> dict:
+    """
+    Validated signal {"recommendation", "confidence", "reason"} for
+    prompt; raises SignalParseError if no usable answer. If usage (engine.usage.new_usage()) is
+    given, tokens of every request made for this call are added to it,
+    including hedges and answers that fail to parse. attempt > 1 queues
+    the call behind first attempts when rate limited; AdmissionShed
+    means it could not have started within timeout.
+    """
+    ttl = CACHE_TTLS.get(domain, 0)
+    key = cache_key(MODEL, TEMPERATURE, prompt)
+
+    if ttl > 0:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return dict(cached)
+
+    try:
+        if HEDGE_ENABLED:
+            data = await _hedged_request(prompt, domain, timeout, agent, usage, attempt)
+        else:
+            data = await _request(prompt, domain, timeout, agent, usage, attempt)
+    except AdmissionShed:
+        # never sent; counted in llm_shed
+        raise
+    except Exception:
+        llm_errors.inc(MODEL, domain)
+        raise
+
+    # only validated signals get this far, so a bad answer is never
+    # cached and replayed into the retry loop
+    if ttl > 0:
+        await cache.aset(key, data, ttl)
+
+    return data
+
+
+async def call_llm_packed(prompt: str, keys: list, domain: str = None, timeout: float = None,
+                          agent: str = None, usage: dict = None) -> dict:
+    """
+    One call answering for several keys (e.g. symbols) at once, as a JSON
+    object keyed by key. Returns {key: signal or None}; None marks a key
+    that was missing or malformed in the answer, for the caller to retry
+    on its own. Not cached or hedged.
+    """
+    try:
+        raw = await _complete(
+            prompt, domain, timeout, agent, usage,
+            packed_signal_schema(keys, domain) if STRUCTURED_OUTPUT else None,
+            answers=len(keys),
+        )
+    except AdmissionShed:
+        raise
+    except Exception:
+        llm_errors.inc(MODEL, domain)
+        raise
+    return parse_packed(raw, keys, domain)
@@ -1,11 +1,124 @@
+import os
+import sys
 import json
+import queue
+import atexit
+import random
+import threading
 
-def log_event(state, event, payload=None):
-    print(json.dumps({
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# default level per event type; anything unlisted is INFO
+EVENT_LEVELS = {
+    "agent_a_call": "DEBUG",
+    "agent_b_call": "DEBUG",
+    "agent_a_failed": "WARNING",
+    "agent_b_failed": "WARNING",
+}
+
+# minimum level emitted; set LOG_LEVEL=INFO in production to drop *_call events
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+
+def _parse_rates(spec):
+    # "agent_a_result=0.1,aggregate=0.5"
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, rate = part.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+# fraction of each event type to keep, e.g. LOG_SAMPLE="agent_a_result=0.1"
+LOG_SAMPLE = _parse_rates(os.getenv("LOG_SAMPLE", ""))
+
+# event types to drop outright, e.g. LOG_DROP="agent_a_call,agent_b_call"
+LOG_DROP = set(filter(None, (e.strip() for e in os.getenv("LOG_DROP", "").split(","))))
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+class EventLogger:
+    """
+    Serializes and writes events on a background thread. log() only
+    filters and enqueues; when the queue is full the event is dropped and
+    counted rather than slowing the request down.
+    """
+
+    def __init__(self, stream=None, queue_size=LOG_QUEUE_SIZE):
+        self.stream = stream
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {"emitted": 0, "filtered": 0, "sampled_out": 0, "dropped": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="event-logger", daemon=True
+                    )
+                    self._thread.start()
+
+    def enabled(self, event, level):
+        if event in LOG_DROP or LEVELS[level] < LEVELS.get(LOG_LEVEL, 10):
+            self.stats["filtered"] += 1
+            return False
+        rate = LOG_SAMPLE.get(event)
+        if rate is not None and random.random() >= rate:
+            self.stats["sampled_out"] += 1
+            return False
+        return True
+
+    def log(self, fields):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # write whatever else is already waiting in one call
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            lines = [json.dumps(f, default=str) for f in batch if f is not None]
+            if lines:
+                stream = self.stream or sys.stdout
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+                self.stats["emitted"] += len(lines)
+            if stop:
+                return
+
+
+logger = EventLogger()
+atexit.register(logger.close)
+
+
+def log_event(state, event, payload=None, level=None):
+    level = level or EVENT_LEVELS.get(event, "INFO")
+    if not logger.enabled(event, level):
+        return
+
+    logger.log({
         "request_id": state["request_id"],
         "event": event,
+        "level": level,
         "a_attempts": state["a_attempts"],
         "b_attempts": state["b_attempts"],
         "domain": state["domain"],
         "payload": payload
-    }))
+    })
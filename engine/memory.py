@@ -1,20 +1,263 @@
+import os
 import json
 import time
+import queue
+import atexit
+import sqlite3
+import threading
 
-MEMORY_FILE = "memory.jsonl"
+from engine.logging import log_event
+
+MEMORY_DB = os.getenv("MEMORY_DB", "memory.db")
+
+# group commit: flush once this many records are queued ...
+MEMORY_BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "256"))
+# ... or once the oldest queued record has waited this long (seconds)
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "0.05"))
+MEMORY_QUEUE_SIZE = int(os.getenv("MEMORY_QUEUE_SIZE", "10000"))
+# SQLite synchronous level for writer commits: "full" fsyncs every batch,
+# "normal" only at WAL checkpoints, "off" leaves it to the OS
+MEMORY_FSYNC = os.getenv("MEMORY_FSYNC", "normal")
+# a batch that fails (e.g. "database is locked") is tried this many more
+# times, with exponential backoff, before its records are given up on
+MEMORY_WRITE_RETRIES = int(os.getenv("MEMORY_WRITE_RETRIES", "3"))
+MEMORY_RETRY_BACKOFF = 0.1
+
+# log_event fields for writer events that belong to no single decision
+_WRITER = {"request_id": None, "domain": None, "a_attempts": 0, "b_attempts": 0}
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_id TEXT,
+    domain TEXT,
+    timestamp REAL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memory_domain_id ON memory (domain, id);
+CREATE INDEX IF NOT EXISTS memory_request_id ON memory (request_id, id);
+"""
+
+def _conn(synchronous="normal"):
+    # one connection per thread; WAL lets readers run alongside the writer
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != MEMORY_DB:
+        conn = sqlite3.connect(MEMORY_DB)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={synchronous.upper()}")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+        _local.path = MEMORY_DB
+    return conn
+
+def _row(record):
+    return (
+        record.get("request_id"),
+        record.get("domain"),
+        record.get("timestamp"),
+        json.dumps(record),
+    )
+
+def _insert_many(conn, rows):
+    with conn:
+        conn.executemany(
+            "INSERT INTO memory (request_id, domain, timestamp, record) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+class MemoryWriteError(Exception):
+    pass
+
+class MemoryWriter:
+    """
+    Background group-commit writer. submit() only enqueues; a daemon
+    thread drains the queue and writes batches in one transaction each.
+    When the queue is full submit() blocks, which is the backpressure
+    signal (counted in stats["full_waits"]). A batch that still fails
+    after MEMORY_WRITE_RETRIES is logged and counted in stats["lost"].
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        batch_size=MEMORY_BATCH_SIZE,
+        flush_interval=MEMORY_FLUSH_INTERVAL,
+        queue_size=MEMORY_QUEUE_SIZE,
+        fsync=MEMORY_FSYNC,
+        retries=MEMORY_WRITE_RETRIES,
+    ):
+        self.batch_size = batch_size
+        self.retries = retries
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "errors": 0,
+            "retries": 0,
+            "lost": 0,
+            "full_waits": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="memory-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, record):
+        self._ensure_started()
+        row = _row(record)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.stats["full_waits"] += 1
+            self._queue.put(row)
+        self.stats["submitted"] += 1
+        depth = self._queue.qsize()
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """
+        Block until everything submitted so far is on disk. Raises
+        MemoryWriteError if records were lost meanwhile, which may
+        include the caller's.
+        """
+        if self._thread is None:
+            return
+        lost = self.stats["lost"]
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+        if self.stats["lost"] != lost:
+            raise MemoryWriteError(f"{self.stats['lost'] - lost} memory records could not be written")
+
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        conn = _conn(self.fsync)
+        stop = False
+        while not stop:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self._STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            # drain without waiting so shutdown and flush() see everything
+            if stop or waiters:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not self._STOP:
+                        batch.append(item)
+
+            if batch:
+                started = time.perf_counter()
+                self._write(conn, batch)
+                self.stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+            for w in waiters:
+                w.set()
+
+    def _write(self, conn, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                _insert_many(conn, batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                error = e
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                time.sleep(MEMORY_RETRY_BACKOFF * 2 ** attempt)
+        self.stats["lost"] += len(batch)
+        log_event(_WRITER, "memory_write_failed", {
+            "error": repr(error),
+            "request_ids": [row[0] for row in batch],
+        }, level="ERROR")
+
+writer = MemoryWriter()
+atexit.register(writer.close)
 
 def write_memory(record):
-    with open(MEMORY_FILE, "a") as f:
-        f.write(json.dumps(record) + "\n")
+    writer.submit(record)
 
 def load_memory(domain=None, limit=20):
-    records = []
-    try:
-        with open(MEMORY_FILE, "r") as f:
-            for line in f:
-                r = json.loads(line)
-                if domain is None or r["domain"] == domain:
-                    records.append(r)
-    except FileNotFoundError:
-        pass
-    return records[-limit:]
+    conn = _conn()
+    if domain is None:
+        rows = conn.execute(
+            "SELECT record FROM memory ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT record FROM memory WHERE domain = ? ORDER BY id DESC LIMIT ?",
+            (domain, limit),
+        ).fetchall()
+    # oldest first, same order the records were written
+    return [json.loads(r[0]) for r in reversed(rows)]
+
+def get_memory(request_id):
+    """Latest record for request_id, or None."""
+    row = _conn().execute(
+        "SELECT record FROM memory WHERE request_id = ? ORDER BY id DESC LIMIT 1",
+        (request_id,),
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def import_jsonl(path="memory.jsonl", batch_size=10000):
+    """One-off migration of a legacy memory.jsonl into the store."""
+    conn = _conn()
+    count = 0
+    batch = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(_row(json.loads(line)))
+            if len(batch) >= batch_size:
+                _insert_many(conn, batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        _insert_many(conn, batch)
+        count += len(batch)
+    return count
@@ -0,0 +1,181 @@
+"""
+Minimal Prometheus-style metrics.
+
+Updates come from the event loop and from other threads too: LangGraph
+runs sync nodes (and their timed_node wrappers) in executor threads, and
+the sync /metrics endpoint renders from FastAPI's threadpool. Each metric
+takes a short uncontended lock per update, and samples() reads a
+snapshot taken under it. render() produces the text exposition format
+for /metrics.
+"""
+import time
+import bisect
+import threading
+from functools import wraps
+import inspect
+
+# seconds; covers sub-ms bookkeeping nodes up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_registry = []
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def items(self):
+        """(label values, value) pairs."""
+        with self._lock:
+            return list(self._values.items())
+
+    def samples(self):
+        for labels, value in self.items():
+            yield self.name + _fmt_labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                yield (
+                    self.name + "_bucket" + _fmt_labels(self.labels, labels, ("le", bound)),
+                    cumulative,
+                )
+            yield self.name + "_sum" + _fmt_labels(self.labels, labels), series[-1]
+            yield self.name + "_count" + _fmt_labels(self.labels, labels), cumulative
+
+
+def render(extra=()):
+    """
+    Text exposition of every registered metric. extra is an iterable of
+    (name, kind, help, value) for values that live elsewhere, e.g. the
+    stats dicts of the cache or the memory writer.
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {value}")
+    for name, kind, help, value in extra:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Engine metrics
+# -------------------------
+node_latency = Histogram(
+    "fsm_node_latency_seconds", "Wall time per graph node", ["node"]
+)
+llm_latency = Histogram(
+    "fsm_llm_latency_seconds", "Chat completion round trip", ["model", "domain"]
+)
+llm_errors = Counter(
+    "fsm_llm_errors_total", "LLM calls that failed or returned unusable output", ["model", "domain"]
+)
+llm_parse = Counter(
+    "fsm_llm_parse_total", "Answer parsing outcome: strict, tolerant, failed, packed or packed_failed", ["domain", "result"]
+)
+agent_retries = Counter(
+    "fsm_agent_retries_total", "Agent attempts after the first", ["agent", "domain"]
+)
+recommendations = Counter(
+    "fsm_recommendations_total", "Aggregate outcomes", ["domain", "recommendation"]
+)
+llm_tokens = Counter(
+    "fsm_llm_tokens_total", "Tokens billed", ["domain", "agent", "model", "kind"]
+)
+llm_cost = Counter(
+    "fsm_llm_cost_usd_total", "Estimated spend from engine.usage.PRICES", ["domain", "agent", "model"]
+)
+llm_queue_depth = Gauge(
+    "fsm_llm_queue_depth", "LLM calls waiting for rate limit capacity", ["model"]
+)
+llm_queue_wait = Histogram(
+    "fsm_llm_queue_wait_seconds", "Time an LLM call waited for rate limit capacity", ["model", "domain"]
+)
+llm_shed = Counter(
+    "fsm_llm_shed_total", "LLM calls rejected because they could not start before their deadline", ["model", "domain"]
+)
+in_flight = Gauge(
+    "fsm_decisions_in_flight", "Decisions currently running through the graph", ["domain"]
+)
+
+
+def timed_node(name, fn):
+    """Wrap a graph node so its wall time lands in node_latency."""
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def wrapper(state):
+            started = time.perf_counter()
+            try:
+                return await fn(state)
+            finally:
+                node_latency.observe(time.perf_counter() - started, name)
+    else:
+        @wraps(fn)
+        def wrapper(state):
+            started = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                node_latency.observe(time.perf_counter() - started, name)
+    return wrapper
@@ -0,0 +1,154 @@
+"""
+Signal schema and parsing for agent answers.
+
+call_llm asks the model for schema-constrained JSON (signal_schema), so
+the strict path is a single json.loads plus validation. Anything else
+goes through a tolerant extractor (fences, surrounding prose, casing)
+before the answer is declared unusable. Outcomes are counted in
+engine.metrics.llm_parse so the failure rate can be watched.
+"""
+import json
+import math
+
+from engine.metrics import llm_parse
+
+# valid recommendations per domain, a subset of Signal["recommendation"]
+DOMAIN_RECOMMENDATIONS = {
+    "trading": ("BUY", "SELL", "HOLD"),
+    "hiring": ("HIRE", "HOLD", "REJECT"),
+}
+ALL_RECOMMENDATIONS = ("BUY", "SELL", "HOLD", "HIRE", "REJECT")
+
+_decoder = json.JSONDecoder()
+
+
+class SignalParseError(ValueError):
+    pass
+
+
+def _signal_object(domain):
+    return {
+        "type": "object",
+        "properties": {
+            "recommendation": {
+                "type": "string",
+                "enum": list(DOMAIN_RECOMMENDATIONS.get(domain, ALL_RECOMMENDATIONS)),
+            },
+            "confidence": {"type": "number"},
+            "reason": {"type": ["string", "null"]},
+        },
+        "required": ["recommendation", "confidence", "reason"],
+        "additionalProperties": False,
+    }
+
+
+def signal_schema(domain=None):
+    """response_format for the chat-completions API, Signal-shaped."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "signal", "strict": True, "schema": _signal_object(domain)},
+    }
+
+
+def packed_signal_schema(keys, domain=None):
+    """response_format for a packed answer: one Signal per key."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "signals",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {k: _signal_object(domain) for k in keys},
+                "required": list(keys),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def _validate(data, domain, lenient=False):
+    if not isinstance(data, dict):
+        raise SignalParseError("answer is not a JSON object")
+
+    rec = data.get("recommendation")
+    if lenient and isinstance(rec, str):
+        rec = rec.strip().upper()
+    if rec not in DOMAIN_RECOMMENDATIONS.get(domain, ALL_RECOMMENDATIONS):
+        raise SignalParseError(f"bad recommendation {rec!r}")
+
+    conf = data.get("confidence")
+    if lenient and isinstance(conf, str):
+        try:
+            conf = float(conf.strip())
+        except ValueError:
+            raise SignalParseError(f"bad confidence {conf!r}")
+    if isinstance(conf, bool) or not isinstance(conf, (int, float)) \
+            or math.isnan(conf) or not 0.0 <= conf <= 1.0:
+        raise SignalParseError(f"bad confidence {conf!r}")
+
+    reason = data.get("reason")
+    if reason is not None and not isinstance(reason, str):
+        reason = str(reason)
+
+    return {"recommendation": rec, "confidence": float(conf), "reason": reason}
+
+
+def _extract_objects(raw):
+    # every top-level {...} that decodes, in order of appearance
+    i = raw.find("{")
+    while i != -1:
+        try:
+            obj, end = _decoder.raw_decode(raw, i)
+        except ValueError:
+            i = raw.find("{", i + 1)
+            continue
+        yield obj
+        i = raw.find("{", end)
+
+
+def parse_signal(raw, domain=None):
+    """Validated {"recommendation", "confidence", "reason"} or SignalParseError."""
+    try:
+        signal = _validate(json.loads(raw), domain)
+        llm_parse.inc(domain, "strict")
+        return signal
+    except (ValueError, TypeError):
+        pass
+
+    for obj in _extract_objects(raw or ""):
+        try:
+            signal = _validate(obj, domain, lenient=True)
+        except SignalParseError:
+            continue
+        llm_parse.inc(domain, "tolerant")
+        return signal
+
+    llm_parse.inc(domain, "failed")
+    raise SignalParseError(f"no usable signal in {raw[:80]!r}" if raw else "empty answer")
+
+
+def parse_packed(raw, keys, domain=None):
+    """
+    {key: signal or None} from a JSON object keyed by key. Each entry is
+    validated on its own, so one malformed symbol does not sink the rest.
+    """
+    data = None
+    try:
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        for obj in _extract_objects(raw or ""):
+            if isinstance(obj, dict) and any(k in obj for k in keys):
+                data = obj
+                break
+
+    out = {}
+    for key in keys:
+        entry = data.get(key) if isinstance(data, dict) else None
+        try:
+            out[key] = _validate(entry, domain, lenient=True)
+            llm_parse.inc(domain, "packed")
+        except SignalParseError:
+            out[key] = None
+            llm_parse.inc(domain, "packed_failed")
+    return out
@@ -0,0 +1,216 @@
+"""
+Client-side admission control for LLM calls.
+
+One RateLimiter per model keeps two token buckets, requests per minute
+and tokens per minute, refilled continuously the way the provider
+meters them. A call that does not fit waits in a priority queue:
+lower domain rank first (trading before hiring), then first attempts
+before retries, then arrival order. A call that could not start before
+its deadline is shed right away with AdmissionShed instead of queueing
+for nothing. A 429 from the provider holds the queue for its
+retry-after, or empties the buckets, instead of feeding a retry storm.
+
+All methods run on the event loop thread; there are no locks.
+"""
+import time
+import heapq
+import asyncio
+import itertools
+
+from engine.metrics import llm_queue_depth, llm_queue_wait, llm_shed
+
+# lower goes first
+DOMAIN_PRIORITY = {"trading": 0, "hiring": 1}
+DEFAULT_DOMAIN_PRIORITY = 2
+
+
+class AdmissionShed(TimeoutError):
+    """The call could not have started before its deadline."""
+
+
+def priority(domain, attempt=1):
+    return (DOMAIN_PRIORITY.get(domain, DEFAULT_DOMAIN_PRIORITY), attempt > 1)
+
+
+def estimate_tokens(prompt, completion_tokens):
+    # ~4 characters per token is close enough to reserve capacity; the
+    # difference is settled against the billed usage afterwards
+    return len(prompt) // 4 + completion_tokens
+
+
+class _Waiter:
+    __slots__ = ("key", "tokens", "deadline", "wake")
+
+    def __init__(self, key, tokens, deadline):
+        self.key = key
+        self.tokens = tokens
+        self.deadline = deadline
+        self.wake = None
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class RateLimiter:
+    """
+    rpm / tpm of 0 leave that dimension unlimited. Buckets start full,
+    so a cold process may burst up to one minute's allowance.
+    """
+
+    def __init__(self, model, rpm=0, tpm=0):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "shed": 0,
+            "rate_limited": 0,
+            "max_depth": 0,
+            "wait_seconds": 0.0,
+        }
+
+    # -- buckets --
+
+    def _refill(self, now):
+        elapsed = now - self._refilled
+        self._refilled = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _delay(self, requests, tokens, now):
+        """Seconds until `requests` calls worth `tokens` fit, from the current levels."""
+        wait = max(0.0, self._paused_until - now)
+        if self.rpm:
+            wait = max(wait, (requests - self._requests) * 60 / self.rpm)
+        if self.tpm:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _clamp(self, tokens):
+        # a single call larger than the whole bucket would never fit
+        return min(tokens, self.tpm) if self.tpm else tokens
+
+    # -- queue --
+
+    def depth(self):
+        return len(self._queue)
+
+    def _ahead(self, key):
+        n, tokens = 0, 0
+        for w in self._queue:
+            if w.key < key:
+                n += 1
+                tokens += w.tokens
+        return n, tokens
+
+    def _remove(self, waiter):
+        was_head = self._queue and self._queue[0] is waiter
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+        llm_queue_depth.set(self.model, value=len(self._queue))
+        if was_head:
+            self._wake_head()
+
+    def _wake_head(self):
+        if self._queue:
+            head = self._queue[0]
+            if head.wake is not None and not head.wake.done():
+                head.wake.set_result(None)
+
+    def _shed(self, domain):
+        self.stats["shed"] += 1
+        llm_shed.inc(self.model, domain)
+        raise AdmissionShed(f"{self.model}: no capacity before the deadline")
+
+    async def acquire(self, tokens, domain=None, attempt=1, deadline=None):
+        """
+        Wait until the call may start and reserve its capacity. deadline
+        is a time.monotonic() value by which the call must have started.
+        Returns the seconds spent waiting; raises AdmissionShed.
+        """
+        if not self.rpm and not self.tpm:
+            return 0.0
+        tokens = self._clamp(tokens)
+        started = now = time.monotonic()
+        self._refill(now)
+        key = priority(domain, attempt) + (next(self._seq),)
+
+        if not self._queue and self._delay(1, tokens, now) <= 0:
+            self._take(tokens)
+            llm_queue_wait.observe(0.0, self.model, domain)
+            return 0.0
+
+        # everything ranked ahead is served first, so it counts against the deadline
+        n, ahead = self._ahead(key)
+        if deadline is not None and now + self._delay(n + 1, ahead + tokens, now) > deadline:
+            self._shed(domain)
+
+        waiter = _Waiter(key, tokens, deadline)
+        heapq.heappush(self._queue, waiter)
+        self.stats["queued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+        llm_queue_depth.set(self.model, value=len(self._queue))
+        # a new head may have jumped ahead of a sleeping one; it re-checks on wake
+        self._wake_head()
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._queue[0] is waiter:
+                    wait = self._delay(1, tokens, now)
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        llm_queue_depth.set(self.model, value=len(self._queue))
+                        self._take(tokens)
+                        self._wake_head()
+                        waited = now - started
+                        self.stats["wait_seconds"] += waited
+                        llm_queue_wait.observe(waited, self.model, domain)
+                        return waited
+                else:
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline or (wait is not None and now + wait > deadline):
+                        self._shed(domain)
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                waiter.wake = asyncio.get_running_loop().create_future()
+                await asyncio.wait({waiter.wake}, timeout=wait)
+        except BaseException:
+            if waiter in self._queue:
+                self._remove(waiter)
+            raise
+
+    def _take(self, tokens):
+        self.stats["admitted"] += 1
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+
+    def settle(self, reserved, used):
+        """Charge the difference between the reservation and the billed tokens."""
+        if self.tpm:
+            self._tokens -= used - self._clamp(reserved)
+
+    def rate_limited(self, retry_after=None):
+        """
+        The provider answered 429. Honour its retry-after if it sent one;
+        otherwise empty the buckets so queued calls go out at the
+        configured rate rather than in another burst.
+        """
+        self.stats["rate_limited"] += 1
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        else:
+            self._refill(time.monotonic())
+            self._requests = min(self._requests, 0.0)
+            self._tokens = min(self._tokens, 0.0)
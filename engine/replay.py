@@ -0,0 +1,351 @@
+"""
+Offline replay of stored decisions against alternative consensus rules.
+
+Reads the agent_a/agent_b signals of past decisions from the memory
+store (or a legacy memory.jsonl) in batches of NumPy columns and
+evaluates the aggregate/policy rule for a grid of auto-action thresholds
+without calling any LLM:
+
+    signals agree and score >= threshold  -> act on the shared recommendation
+    signals agree and score <  threshold  -> REVIEW
+    signals disagree or one is missing    -> REVIEW
+
+score is the lower of the two confidences, as in engine/graph.aggregate_node,
+or their mean. "min" at threshold 0 is the engine default; 0.7 is the
+AUTO_ACTION_THRESHOLD of the legacy fsm.py/graph.py.
+
+Only counts are kept between batches, so memory stays flat however long
+the history is, and the store can be split by id range across processes.
+
+    python -m engine.replay --thresholds 0:1:0.05 --workers 4 --out replay.json
+"""
+import sys
+import json
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import memory
+from engine.parsing import ALL_RECOMMENDATIONS, DOMAIN_RECOMMENDATIONS
+
+OUTCOMES = ALL_RECOMMENDATIONS + ("REVIEW",)
+MISSING = -1
+_CODES = {r: i for i, r in enumerate(OUTCOMES)}
+
+# how the two confidences become one score
+COMBINE = ("min", "mean")
+
+BATCH_SIZE = 50000
+HISTOGRAM_BINS = 20
+DEFAULT_THRESHOLDS = "0:1:0.05"
+
+_SQL = """
+SELECT id, domain,
+       json_extract(record, '$.agent_a.recommendation'),
+       json_extract(record, '$.agent_a.confidence'),
+       json_extract(record, '$.agent_b.recommendation'),
+       json_extract(record, '$.agent_b.confidence'),
+       json_extract(record, '$.final_recommendation'),
+       json_extract(record, '$.human_override')
+FROM memory
+WHERE id > ? AND id <= ? {where}
+ORDER BY id
+LIMIT ?
+"""
+
+
+def parse_thresholds(spec):
+    """Comma separated values, or "start:stop:step" with stop inclusive."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = np.array([float(x) for x in spec.split(",") if x])
+    return np.round(np.sort(values), 6)
+
+
+def _codes(values):
+    return np.fromiter((_CODES.get(v, MISSING) for v in values), dtype=np.int8, count=len(values))
+
+
+def _count_ge(values, thresholds):
+    # for every threshold, how many values are >= it
+    ordered = np.sort(values)
+    return len(ordered) - np.searchsorted(ordered, thresholds, side="left")
+
+
+class DomainStats:
+    """Additive counts for one domain, see Replay."""
+
+    def __init__(self, domain, thresholds):
+        self.domain = domain
+        self.thresholds = thresholds
+        shape = (len(COMBINE), len(thresholds))
+        self.rows = 0
+        self.both = 0
+        self.agree = 0
+        self.human = 0
+        # recorded final outcome, last slot for records without one
+        self.recorded = np.zeros(len(OUTCOMES) + 1, dtype=np.int64)
+        # [combine, threshold, recommendation] decisions acted on
+        self.auto = np.zeros(shape + (len(ALL_RECOMMENDATIONS),), dtype=np.int64)
+        # acted-on decisions that a human also decided, and matched
+        self.human_auto = np.zeros(shape, dtype=np.int64)
+        self.human_match = np.zeros(shape, dtype=np.int64)
+        self.histogram = np.zeros((len(COMBINE), HISTOGRAM_BINS), dtype=np.int64)
+
+    def update(self, rec_a, conf_a, rec_b, conf_b, final, human):
+        self.rows += len(rec_a)
+        both = (rec_a >= 0) & (rec_b >= 0) & ~np.isnan(conf_a) & ~np.isnan(conf_b)
+        agree = both & (rec_a == rec_b)
+        self.both += int(both.sum())
+        self.agree += int(agree.sum())
+        self.human += int((human >= 0).sum())
+        self.recorded += np.bincount(
+            np.where(final >= 0, final, len(OUTCOMES)), minlength=len(OUTCOMES) + 1
+        )
+
+        rec = rec_a[agree]
+        a, b = conf_a[agree], conf_b[agree]
+        decided = human[agree] >= 0
+        matched = decided & (human[agree] == rec)
+        for c, score in enumerate((np.minimum(a, b), (a + b) / 2)):
+            self.histogram[c] += np.histogram(score, bins=HISTOGRAM_BINS, range=(0.0, 1.0))[0]
+            for r in range(len(ALL_RECOMMENDATIONS)):
+                self.auto[c, :, r] += _count_ge(score[rec == r], self.thresholds)
+            self.human_auto[c] += _count_ge(score[decided], self.thresholds)
+            self.human_match[c] += _count_ge(score[matched], self.thresholds)
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.both += other.both
+        self.agree += other.agree
+        self.human += other.human
+        self.recorded += other.recorded
+        self.auto += other.auto
+        self.human_auto += other.human_auto
+        self.human_match += other.human_match
+        self.histogram += other.histogram
+
+    def report(self):
+        recs = DOMAIN_RECOMMENDATIONS.get(self.domain, ALL_RECOMMENDATIONS)
+        rows = max(self.rows, 1)
+        variants = []
+        for c, combine in enumerate(COMBINE):
+            for t, threshold in enumerate(self.thresholds):
+                acted = self.auto[c, t]
+                outcomes = {r: int(acted[ALL_RECOMMENDATIONS.index(r)]) for r in recs}
+                outcomes["REVIEW"] = self.rows - int(acted.sum())
+                judged = int(self.human_auto[c, t])
+                variants.append({
+                    "combine": combine,
+                    "threshold": float(threshold),
+                    "outcomes": outcomes,
+                    "auto_rate": round(int(acted.sum()) / rows, 4),
+                    # of the acted-on decisions a reviewer also saw, how
+                    # many the reviewer would have made the same way
+                    "human_decided": judged,
+                    "human_agreement": (
+                        round(int(self.human_match[c, t]) / judged, 4) if judged else None
+                    ),
+                })
+        recorded = {r: int(n) for r, n in zip(OUTCOMES, self.recorded) if n}
+        if self.recorded[-1]:
+            recorded["NONE"] = int(self.recorded[-1])
+        return {
+            "rows": self.rows,
+            "both_signals": self.both,
+            "missing_signal": self.rows - self.both,
+            "agent_agreement": round(self.agree / self.both, 4) if self.both else None,
+            "human_decisions": self.human,
+            "recorded": recorded,
+            "score_histogram": {
+                combine: self.histogram[c].tolist() for c, combine in enumerate(COMBINE)
+            },
+            "variants": variants,
+        }
+
+
+class Replay:
+    """
+    Per-domain counts over any number of batches. Everything is a sum,
+    so replays of disjoint slices of the history merge() exactly.
+    """
+
+    def __init__(self, thresholds):
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.domains = {}
+
+    def _stats(self, domain):
+        stats = self.domains.get(domain)
+        if stats is None:
+            stats = self.domains[domain] = DomainStats(domain, self.thresholds)
+        return stats
+
+    def update(self, rows):
+        """rows: (domain, rec_a, conf_a, rec_b, conf_b, final, human) tuples."""
+        if not rows:
+            return
+        domain, rec_a, conf_a, rec_b, conf_b, final, human = zip(*rows)
+        domain = np.array([d or "" for d in domain], dtype=object)
+        columns = (
+            _codes(rec_a), np.array(conf_a, dtype=float),
+            _codes(rec_b), np.array(conf_b, dtype=float),
+            _codes(final), _codes(human),
+        )
+        for name in np.unique(domain):
+            mask = domain == name
+            self._stats(name).update(*(col[mask] for col in columns))
+
+    def merge(self, other):
+        for name, stats in other.domains.items():
+            self._stats(name).merge(stats)
+
+    def report(self):
+        return {name: stats.report() for name, stats in sorted(self.domains.items())}
+
+
+# -------------------------
+# Readers
+# -------------------------
+def iter_store(db=None, domain=None, start=0, stop=None, batch_size=BATCH_SIZE):
+    """Batches of row tuples from the SQLite store, ids in (start, stop]."""
+    # own read-only connection: safe in worker processes and alongside the writer
+    conn = sqlite3.connect(f"file:{db or memory.MEMORY_DB}?mode=ro", uri=True)
+    sql = _SQL.format(where="AND domain = ?" if domain else "")
+    stop = sys.maxsize if stop is None else stop
+    try:
+        last = start
+        while True:
+            params = (last, stop, domain, batch_size) if domain else (last, stop, batch_size)
+            rows = conn.execute(sql, params).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [r[1:] for r in rows]
+    finally:
+        conn.close()
+
+
+def _record_row(record):
+    a = record.get("agent_a") or {}
+    b = record.get("agent_b") or {}
+    return (
+        record.get("domain"),
+        a.get("recommendation"), a.get("confidence"),
+        b.get("recommendation"), b.get("confidence"),
+        record.get("final_recommendation"),
+        record.get("human_override"),
+    )
+
+
+def iter_jsonl(path, domain=None, batch_size=BATCH_SIZE):
+    """Batches of row tuples from a memory.jsonl file, read line by line."""
+    batch = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if domain and record.get("domain") != domain:
+                continue
+            batch.append(_record_row(record))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+# -------------------------
+# Entry points
+# -------------------------
+def _replay_range(args):
+    db, domain, start, stop, thresholds, batch_size = args
+    replay = Replay(thresholds)
+    for rows in iter_store(db, domain, start, stop, batch_size):
+        replay.update(rows)
+    return replay
+
+
+def replay_store(thresholds, db=None, domain=None, workers=1, batch_size=BATCH_SIZE):
+    """Replay the SQLite store, split into id ranges over `workers` processes."""
+    db = db or memory.MEMORY_DB
+    if workers <= 1:
+        return _replay_range((db, domain, 0, None, thresholds, batch_size))
+
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        lo, hi = conn.execute("SELECT MIN(id), MAX(id) FROM memory").fetchone()
+    finally:
+        conn.close()
+    total = Replay(thresholds)
+    if lo is None:
+        return total
+    bounds = np.linspace(lo - 1, hi, workers + 1).astype(np.int64)
+    ranges = [
+        (db, domain, int(bounds[i]), int(bounds[i + 1]), thresholds, batch_size)
+        for i in range(workers)
+    ]
+    with ProcessPoolExecutor(workers) as pool:
+        for part in pool.map(_replay_range, ranges):
+            total.merge(part)
+    return total
+
+
+def replay_jsonl(path, thresholds, domain=None, batch_size=BATCH_SIZE):
+    replay = Replay(thresholds)
+    for rows in iter_jsonl(path, domain, batch_size):
+        replay.update(rows)
+    return replay
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored decisions against consensus thresholds")
+    parser.add_argument("--db", help="memory store (default MEMORY_DB)")
+    parser.add_argument("--jsonl", help="read a legacy memory.jsonl instead of the store")
+    parser.add_argument("--domain")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS,
+                        help='comma separated, or "start:stop:step"')
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes splitting the store by id range")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    thresholds = parse_thresholds(args.thresholds)
+    if args.jsonl:
+        replay = replay_jsonl(args.jsonl, thresholds, args.domain, args.batch_size)
+    else:
+        replay = replay_store(thresholds, args.db, args.domain, args.workers, args.batch_size)
+    report = replay.report()
+
+    for name, stats in report.items():
+        print(
+            f"{name}: {stats['rows']} decisions, agents agree {stats['agent_agreement']}, "
+            f"missing signal {stats['missing_signal']}",
+            file=sys.stderr,
+        )
+        for v in stats["variants"]:
+            if v["combine"] == "min":
+                print(
+                    f"  min>={v['threshold']:<5} auto={v['auto_rate']:<7} "
+                    f"review={v['outcomes']['REVIEW']:<8} human_agreement={v['human_agreement']}",
+                    file=sys.stderr,
+                )
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
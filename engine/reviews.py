@@ -0,0 +1,121 @@
+import asyncio
+
+from engine.graph import get_app, policy_router
+from engine.logging import log_event
+from engine.metrics import in_flight
+from engine.store import store
+
+def _summary(state):
+    return {
+        "request_id": state["request_id"],
+        "domain": state["domain"],
+        "agent_a": state.get("agent_a"),
+        "agent_b": state.get("agent_b"),
+        "final_recommendation": state.get("final_recommendation"),
+        "final_confidence": state.get("final_confidence"),
+    }
+
+def add_pending(state):
+    store.add_pending(_summary(state))
+
+def take_pending(request_id):
+    """Remove and return a pending review; None if unknown or already taken."""
+    return store.take_pending(request_id)
+
+def list_pending(domain=None, limit=100):
+    return store.list_pending(domain, limit)
+
+def get_decision(request_id):
+    return store.get_decision(request_id)
+
+def _config(request_id):
+    return {"configurable": {"thread_id": request_id}}
+
+# The store is blocking I/O (SQLite waits up to SQLITE_BUSY_TIMEOUT on
+# another worker's lock), so the async paths below call it in a thread.
+
+async def _settle(graph, result):
+    # after a run stops: park it for review or drop its checkpoint
+    if policy_router(result) == "HUMAN":
+        await asyncio.to_thread(add_pending, result)
+        log_event(result, "human_review_required")
+    else:
+        await graph.checkpointer.adelete_thread(result["request_id"])
+
+async def run_decision(state):
+    """
+    Run the durable graph for one decision. If it stops before human
+    review the thread stays checkpointed and is listed as pending;
+    otherwise the checkpoint is dropped.
+    """
+    graph = await get_app(state["domain"])
+    config = _config(state["request_id"])
+    in_flight.inc(state["domain"])
+    try:
+        # checkpoint only when the run stops (finished or interrupted)
+        result = await graph.ainvoke(state, config, durability="exit")
+    finally:
+        in_flight.dec(state["domain"])
+    await _settle(graph, result)
+    return result
+
+async def stream_decision(state):
+    """
+    Like run_decision, but yields (node, update) as each node finishes,
+    then ("human_review_required", summary) if the run paused, and
+    finally ("result", final state).
+    """
+    graph = await get_app(state["domain"])
+    config = _config(state["request_id"])
+    in_flight.inc(state["domain"])
+    result = None
+    try:
+        async for mode, chunk in graph.astream(
+            state, config, stream_mode=["updates", "values", "custom"], durability="exit"
+        ):
+            if mode == "values":
+                # the last one is the state the run stopped with
+                result = chunk
+                continue
+            for node, update in chunk.items():
+                # the interrupt marker carries nothing to show; "agents"
+                # (parallel graph) repeats what its attempts already sent
+                # on "custom" as agent_a/agent_b
+                if update and node not in ("__interrupt__", "agents"):
+                    yield node, update
+    finally:
+        in_flight.dec(state["domain"])
+
+    await _settle(graph, result)
+    if policy_router(result) == "HUMAN":
+        yield "human_review_required", _summary(result)
+    yield "result", result
+
+async def resume_review(request_id, decision, reason):
+    """
+    Apply a reviewer's decision to a paused thread and run it on through
+    human review and persist_memory. No agent node runs again.
+    Returns None if there is no pending review for request_id.
+    """
+    pending = await asyncio.to_thread(take_pending, request_id)
+    if pending is None:
+        return None
+
+    graph = await get_app(pending["domain"])
+    config = _config(request_id)
+    try:
+        # as_node="aggregate" re-routes through policy_router, which still
+        # sees REVIEW and continues into the human node
+        await graph.aupdate_state(
+            config,
+            {"human_override": decision, "human_reason": reason},
+            as_node="aggregate",
+        )
+        result = await graph.ainvoke(None, config, durability="exit")
+    except Exception:
+        # leave it reviewable
+        await asyncio.to_thread(store.add_pending, pending)
+        raise
+
+    await graph.checkpointer.adelete_thread(request_id)
+    return result
@@ -0,0 +1,38 @@
+import json
+import copy
+import asyncio
+import hashlib
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one in-flight task.
+    Every caller gets its own copy of the shared result (or exception).
+    The task is shielded so a caller that disconnects does not cancel
+    it for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+
+def decision_key(state) -> str:
+    payload = json.dumps(state["payload"], sort_keys=True)
+    return state["domain"] + ":" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+decisions = SingleFlight()
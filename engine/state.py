@@ -1,9 +1,15 @@
+import operator
 from typing import TypedDict, Optional, List, Literal, Dict, Any
+from typing_extensions import Annotated
+
+from engine.usage import merge_usage
 
 class Signal(TypedDict):
     recommendation: Literal["BUY", "SELL", "HOLD", "HIRE", "REJECT", "REVIEW"]
     confidence: float
     reason: Optional[str]
+    # tokens/cost of the attempt that produced this signal (engine.usage)
+    usage: Optional[Dict[str, Any]]
 
 class DecisionState(TypedDict):
     domain: str
@@ -18,11 +24,18 @@ class DecisionState(TypedDict):
     human_override: Optional[str]
     human_reason: Optional[str]
 
-    trace: List[str]
+    # appended to by both agents in the same step under the parallel graph
+    trace: Annotated[List[str], operator.add]
     a_attempts: int
     b_attempts: int
     request_id: str
 
+    # {"agent_a": usage, "agent_b": usage} summed over every attempt
+    usage: Annotated[Dict[str, Dict[str, Any]], merge_usage]
+
+    # absolute time.time() by which the agents must be done (engine.graph.deadline_for)
+    deadline: float
+
 class MemoryRecord(TypedDict):
     request_id: str
     domain: str
@@ -32,4 +45,5 @@ class MemoryRecord(TypedDict):
     final_recommendation: str
     final_confidence: float
     human_override: Optional[str]
+    usage: Dict[str, Dict[str, Any]]
     timestamp: float
\ No newline at end of file
@@ -0,0 +1,297 @@
+"""
+Shared state behind pending reviews, jobs and decision lookups.
+
+Nothing a request may need from another worker is kept in process
+memory, so uvicorn can run with --workers N, or on several machines.
+POST /human/override then finds its review whichever worker paused it.
+
+STATE_STORE selects the backend:
+
+    sqlite               SQLite/WAL files (REVIEW_DB, MEMORY_DB) shared by
+                         every worker on one host (default)
+    package.module:name  a ReviewStore instance, class or factory, e.g.
+                         one backed by Redis or Postgres for several hosts
+
+Across hosts the paused graph threads must be shared too; see
+CHECKPOINTER in engine/graph.py.
+"""
+import abc
+import os
+import json
+import time
+import sqlite3
+import importlib
+import threading
+
+from engine import memory
+
+STATE_STORE = os.getenv("STATE_STORE", "sqlite")
+REVIEW_DB = os.getenv("REVIEW_DB", "reviews.db")
+
+# how long a worker waits on another worker's write lock (seconds)
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+
+
+def load_object(spec):
+    """Resolve "package.module:name"."""
+    module, _, name = spec.partition(":")
+    if not name:
+        raise ValueError(f"expected 'package.module:name', got {spec!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+class ReviewStore(abc.ABC):
+    """
+    Interface for the shared state. Summaries are JSON-serialisable dicts
+    with at least request_id and domain.
+
+    take_pending must be atomic across workers: when several overrides
+    race, exactly one gets the summary and the others get None. Every
+    method is abstract, so an incomplete backend fails in create_store
+    rather than on the first request that needs the missing method.
+    """
+
+    @abc.abstractmethod
+    def add_pending(self, summary):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def take_pending(self, request_id):
+        """Remove and return a pending review; None if unknown or already taken."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_pending(self, domain=None, limit=100):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_decision(self, request_id):
+        """Latest persisted decision record for request_id, or None."""
+        raise NotImplementedError
+
+    # jobs (engine.jobs): queued -> running -> done | review | failed
+
+    @abc.abstractmethod
+    def add_job(self, state):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim_job(self):
+        """
+        Mark the oldest queued job running and return its state, or None.
+        Atomic like take_pending: each job is claimed by one runner.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def finish_job(self, request_id, status, error=None):
+        """Record the outcome; status "queued" hands the job back for another runner."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def renew_job(self, request_id):
+        """Extend the claim on a running job; its runner is still alive."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def requeue_stale_jobs(self, lease):
+        """Queue again running jobs whose claim is older than lease seconds; returns how many."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_job(self, request_id):
+        """{request_id, domain, status, submitted_at, updated_at, error}, or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_jobs(self, status):
+        raise NotImplementedError
+
+    # runs of the compiled FSM (engine.fsm) paused before human review
+
+    @abc.abstractmethod
+    def save_thread(self, thread_id, node, state):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_thread(self, thread_id):
+        """(node to resume at, state), or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_thread(self, thread_id):
+        raise NotImplementedError
+
+
+class SqliteReviewStore(ReviewStore):
+    """
+    Pending reviews and jobs in a WAL-mode SQLite file, decisions from
+    the memory store. Every process opens its own connection; SQLite's
+    file locks serialise writers, and DELETE/UPDATE ... RETURNING make
+    take_pending and claim_job atomic.
+    """
+
+    def __init__(self, path=REVIEW_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            db = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=SQLITE_BUSY_TIMEOUT,
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            # same durability as the memory store's default (MEMORY_FSYNC=normal)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pending_reviews ("
+                "request_id TEXT PRIMARY KEY, domain TEXT, created_at REAL, summary TEXT)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS pending_domain ON pending_reviews (domain, created_at)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "request_id TEXT PRIMARY KEY, domain TEXT, status TEXT, "
+                "submitted_at REAL, updated_at REAL, state TEXT, error TEXT, claimed_at REAL)"
+            )
+            try:
+                # job tables created before claims were leased
+                db.execute("ALTER TABLE jobs ADD COLUMN claimed_at REAL")
+            except sqlite3.OperationalError:
+                pass
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted_at)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS fsm_threads ("
+                "thread_id TEXT PRIMARY KEY, node TEXT, state TEXT)"
+            )
+            self._db = db
+        return self._db
+
+    def add_pending(self, summary):
+        with self._lock:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO pending_reviews VALUES (?, ?, ?, ?)",
+                (summary["request_id"], summary["domain"], time.time(), json.dumps(summary)),
+            )
+
+    def take_pending(self, request_id):
+        with self._lock:
+            row = self._conn().execute(
+                "DELETE FROM pending_reviews WHERE request_id = ? RETURNING summary",
+                (request_id,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_pending(self, domain=None, limit=100):
+        with self._lock:
+            if domain is None:
+                rows = self._conn().execute(
+                    "SELECT summary FROM pending_reviews ORDER BY created_at LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn().execute(
+                    "SELECT summary FROM pending_reviews WHERE domain = ? ORDER BY created_at LIMIT ?",
+                    (domain, limit),
+                ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_decision(self, request_id):
+        return memory.get_memory(request_id)
+
+    def add_job(self, state):
+        now = time.time()
+        with self._lock:
+            self._conn().execute(
+                "INSERT INTO jobs VALUES (?, ?, 'queued', ?, ?, ?, NULL, NULL)",
+                (state["request_id"], state["domain"], now, now, json.dumps(state)),
+            )
+
+    def claim_job(self):
+        now = time.time()
+        with self._lock:
+            row = self._conn().execute(
+                "UPDATE jobs SET status = 'running', updated_at = ?, claimed_at = ? WHERE request_id = ("
+                "SELECT request_id FROM jobs WHERE status = 'queued' "
+                "ORDER BY submitted_at LIMIT 1) RETURNING state",
+                (now, now),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def renew_job(self, request_id):
+        with self._lock:
+            self._conn().execute(
+                "UPDATE jobs SET claimed_at = ? WHERE request_id = ? AND status = 'running'",
+                (time.time(), request_id),
+            )
+
+    def requeue_stale_jobs(self, lease):
+        now = time.time()
+        with self._lock:
+            return self._conn().execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ?, claimed_at = NULL "
+                "WHERE status = 'running' AND COALESCE(claimed_at, updated_at) < ?",
+                (now, now - lease),
+            ).rowcount
+
+    def finish_job(self, request_id, status, error=None):
+        with self._lock:
+            # the state is only needed until the job has run
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, "
+                "state = CASE WHEN ? = 'queued' THEN state END "
+                "WHERE request_id = ?",
+                (status, error, time.time(), status, request_id),
+            )
+
+    def get_job(self, request_id):
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT request_id, domain, status, submitted_at, updated_at, error "
+                "FROM jobs WHERE request_id = ?",
+                (request_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("request_id", "domain", "status", "submitted_at", "updated_at", "error")
+        return dict(zip(keys, row))
+
+    def count_jobs(self, status):
+        with self._lock:
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def save_thread(self, thread_id, node, state):
+        with self._lock:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO fsm_threads VALUES (?, ?, ?)",
+                (thread_id, node, json.dumps(state)),
+            )
+
+    def load_thread(self, thread_id):
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT node, state FROM fsm_threads WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._conn().execute("DELETE FROM fsm_threads WHERE thread_id = ?", (thread_id,))
+
+
+def create_store(spec=STATE_STORE):
+    if spec == "sqlite":
+        return SqliteReviewStore()
+    obj = load_object(spec)
+    return obj if isinstance(obj, ReviewStore) else obj()
+
+
+store = create_store()
@@ -0,0 +1,64 @@
+"""
+Token usage and cost accounting for LLM calls.
+
+A usage dict holds calls, prompt/completion/cached token counts and the
+estimated cost in USD. Agent nodes collect one per attempt; the graph
+sums them per agent in DecisionState["usage"], and every completed
+request is also added to the process-wide counters in engine.metrics.
+"""
+
+# USD per 1M tokens: (prompt, cached prompt, completion)
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+
+
+def new_usage():
+    return dict.fromkeys(FIELDS, 0)
+
+
+def usage_from_response(model, resp):
+    u = new_usage()
+    raw = getattr(resp, "usage", None)
+    if raw is None:
+        return u
+    details = getattr(raw, "prompt_tokens_details", None)
+    u["calls"] = 1
+    u["prompt_tokens"] = raw.prompt_tokens or 0
+    u["completion_tokens"] = raw.completion_tokens or 0
+    u["cached_tokens"] = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    prompt_price, cached_price, completion_price = PRICES.get(model, (0.0, 0.0, 0.0))
+    u["cost_usd"] = (
+        (u["prompt_tokens"] - u["cached_tokens"]) * prompt_price
+        + u["cached_tokens"] * cached_price
+        + u["completion_tokens"] * completion_price
+    ) / 1_000_000
+    return u
+
+
+def add_usage(a, b):
+    if not a:
+        return dict(b or new_usage())
+    if not b:
+        return dict(a)
+    return {k: a.get(k, 0) + b.get(k, 0) for k in FIELDS}
+
+
+def merge_usage(left, right):
+    """State reducer: {agent: usage} dicts summed per agent."""
+    merged = dict(left or {})
+    for agent, u in (right or {}).items():
+        merged[agent] = add_usage(merged.get(agent), u)
+    return merged
+
+
+def rollup(per_agent):
+    """Per-agent usage plus a "total" entry, as stored in the memory record."""
+    total = new_usage()
+    for u in per_agent.values():
+        total = add_usage(total, u)
+    return {**per_agent, "total": total}
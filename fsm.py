@@ -13,7 +13,87 @@ class TradeState(TypedDict):
     attempts_b: int
     trace: list[str]
 
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class Trace:
+    """
+    Append-only trace. The digest is chained over the entries as they
+    are appended, so hashing never re-reads the ones before.
+    """
+    __slots__ = ("_items", "_digest")
+
+    def __init__(self, items=()):
+        self._items = []
+        self._digest = b""
+        for item in items:
+            self.append(item)
+
+    def append(self, item: str):
+        self._items.append(item)
+        self._digest = _digest(self._digest + item.encode())
+
+    def digest(self) -> bytes:
+        return self._digest
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __repr__(self):
+        return repr(self._items)
+
+_FIELDS = tuple(f for f in TradeState.__annotations__ if f != "trace")
+_INDEX = {f: i for i, f in enumerate(_FIELDS)}
+
+class FSMState:
+    """
+    TradeState updated in place. Each field's digest is cached until the
+    field is assigned again, and the trace carries its own running
+    digest, so hashing a state costs the same however long the trace or
+    how large the signals get.
+    """
+    __slots__ = _FIELDS + ("trace", "_digests")
+
+    def __init__(self, **values):
+        object.__setattr__(self, "_digests", [None] * len(_FIELDS))
+        for f in _FIELDS:
+            object.__setattr__(self, f, values.get(f))
+        object.__setattr__(self, "trace", Trace(values.get("trace") or ()))
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        i = _INDEX.get(name)
+        if i is not None:
+            self._digests[i] = None
+
+    def update(self, **changes):
+        for name, value in changes.items():
+            setattr(self, name, value)
+
+    def digest(self) -> str:
+        h = hashlib.blake2b(digest_size=4)
+        for i, f in enumerate(_FIELDS):
+            d = self._digests[i]
+            if d is None:
+                d = self._digests[i] = _digest(json.dumps(getattr(self, f), sort_keys=True).encode())
+            h.update(d)
+        h.update(self.trace.digest())
+        return h.hexdigest()
+
+    def as_dict(self) -> TradeState:
+        state = {f: getattr(self, f) for f in _FIELDS}
+        state["trace"] = list(self.trace)
+        return state
+
 def hash_state(state):
+    if isinstance(state, FSMState):
+        return state.digest()
     encoded = json.dumps(state, sort_keys=True).encode()
     return hashlib.sha256(encoded).hexdigest()[:8]
 
@@ -25,18 +105,22 @@ def extract_json(raw):
     raw = raw.strip()
     return json.loads(raw)
 
-def log(node, before, after):
-    def safe(d, k):
-        return d[k] if k in d else None
+def _brief(signal):
+    # only the fields that drive the decision, whatever else the agent sent
+    if not signal:
+        return signal
+    return {"recommendation": signal.get("recommendation"), "confidence": signal.get("confidence")}
 
+def log(node, before, state):
+    # before: digest taken ahead of the transition
     print(
-        f"[{node}] {hash_state(before)} → {hash_state(after)} | "
-        f"A={safe(after,'agent_a')} "
-        f"B={safe(after,'agent_b')} "
-        f"final={safe(after,'final_recommendation')} "
-        f"conf={safe(after,'final_confidence')} "
-        f"a_try={safe(after,'attempts_a')} "
-        f"b_try={safe(after,'attempts_b')}"
+        f"[{node}] {before} → {state.digest()} | "
+        f"A={_brief(state.agent_a)} "
+        f"B={_brief(state.agent_b)} "
+        f"final={state.final_recommendation} "
+        f"conf={state.final_confidence} "
+        f"a_try={state.attempts_a} "
+        f"b_try={state.attempts_b}"
     )
 
 AUTO_ACTION_THRESHOLD = 0.7
@@ -44,45 +128,45 @@ ESCALATION_THRESHOLD = 0.5
 MAX_RETRIES = 2
 
 def aggregate(state):
-    before = state.copy()
-    A = state["agent_a"]
-    B = state["agent_b"]
+    before = state.digest()
+    A = state.agent_a
+    B = state.agent_b
 
     if not A or not B:
-        new = {**state, "final_recommendation": None, "final_confidence": 0.0}
-        log("aggregate_missing", before, new)
-        return new
+        state.update(final_recommendation=None, final_confidence=0.0)
+        log("aggregate_missing", before, state)
+        return state
 
     if A["recommendation"] != B["recommendation"]:
-        new = {**state, "final_recommendation": "REVIEW", "final_confidence": 0.0}
-        log("aggregate_disagree", before, new)
-        return new
+        state.update(final_recommendation="REVIEW", final_confidence=0.0)
+        log("aggregate_disagree", before, state)
+        return state
 
     min_conf = min(A["confidence"], B["confidence"])
 
-    if min_conf >= 0.7:
-        new = {**state, "final_recommendation": A["recommendation"], "final_confidence": min_conf}
-        log("aggregate_consensus", before, new)
-        return new
+    if min_conf >= AUTO_ACTION_THRESHOLD:
+        state.update(final_recommendation=A["recommendation"], final_confidence=min_conf)
+        log("aggregate_consensus", before, state)
+        return state
     else:
-        new = {**state, "final_recommendation": "REVIEW", "final_confidence": min_conf}
-        log("aggregate_weak", before, new)
-        return new
+        state.update(final_recommendation="REVIEW", final_confidence=min_conf)
+        log("aggregate_weak", before, state)
+        return state
 
 
 def policy_gate(state):
-    if state["final_recommendation"] in ["BUY", "SELL", "HOLD"]:
-        return state["final_recommendation"]
-    elif state["final_recommendation"] == "REVIEW":
+    if state.final_recommendation in ["BUY", "SELL", "HOLD"]:
+        return state.final_recommendation
+    elif state.final_recommendation == "REVIEW":
         return "REVIEW"
     else:
         return "FALLBACK"
 
 
 def agent_a_signal(state):
-    before = state.copy()
-    attempts = state["attempts_a"] + 1
-    trace = state["trace"] + [f"A_attempt_{attempts}"]
+    before = state.digest()
+    attempts = state.attempts_a + 1
+    state.trace.append(f"A_attempt_{attempts}")
 
     try:
         raw = llm_call_agent_a()
@@ -93,29 +177,28 @@ def agent_a_signal(state):
         conf = float(data["confidence"])
         if rec not in ["BUY", "SELL", "HOLD"]:
             raise ValueError("bad recommendation")
-        
+
         if not (0 <= conf <= 1):
             raise ValueError("bad confidence")
 
-        new = {**state, "agent_a": {"recommendation": rec, "confidence": conf},
-               "attempts_a": attempts, "trace": trace}
-        log("agent_a", before, new)
-        return new
+        state.update(agent_a={"recommendation": rec, "confidence": conf}, attempts_a=attempts)
+        log("agent_a", before, state)
+        return state
 
     except Exception:
         if attempts < MAX_RETRIES:
-            new = {**state, "attempts_a": attempts, "trace": trace}
-            log("agent_a_retry", before, new)
-            return new
+            state.attempts_a = attempts
+            log("agent_a_retry", before, state)
+            return state
         else:
-            new = {**state, "agent_a": None, "attempts_a": attempts, "trace": trace}
-            log("agent_a_fail", before, new)
-            return new
+            state.update(agent_a=None, attempts_a=attempts)
+            log("agent_a_fail", before, state)
+            return state
 
 def agent_b_signal(state):
-    before = state.copy()
-    attempts = state["attempts_b"] + 1
-    trace = state["trace"] + [f"B_attempt_{attempts}"]
+    before = state.digest()
+    attempts = state.attempts_b + 1
+    state.trace.append(f"B_attempt_{attempts}")
 
     try:
         raw = llm_call_agent_b()
@@ -136,45 +219,40 @@ def agent_b_signal(state):
         if not (0.0 <= conf <= 1.0):
             raise ValueError(f"bad confidence {conf}")
 
-        new = {
-            **state,
-            "agent_b": {"recommendation": rec, "confidence": conf},
-            "attempts_b": attempts,
-            "trace": trace
-        }
+        state.update(agent_b={"recommendation": rec, "confidence": conf}, attempts_b=attempts)
 
-        log("agent_b", before, new)
-        return new
+        log("agent_b", before, state)
+        return state
 
     except Exception:
         if attempts < MAX_RETRIES:
-            new = {**state, "attempts_b": attempts, "trace": trace}
-            log("agent_b_retry", before, new)
-            return new
+            state.attempts_b = attempts
+            log("agent_b_retry", before, state)
+            return state
         else:
-            new = {**state, "agent_b": None, "attempts_b": attempts, "trace": trace}
-            log("agent_b_fail", before, new)
-            return new
+            state.update(agent_b=None, attempts_b=attempts)
+            log("agent_b_fail", before, state)
+            return state
 
 def execute_buy(state):
-    before = state.copy()
-    new = {**state, "next_action": "BUY"}
-    log("BUY", before, new)
-    return new
+    before = state.digest()
+    state.next_action = "BUY"
+    log("BUY", before, state)
+    return state
 
 def human_review(state):
-    before = state.copy()
-    new = {**state, "next_action": "REVIEW"}
-    log("REVIEW", before, new)
-    return new
+    before = state.digest()
+    state.next_action = "REVIEW"
+    log("REVIEW", before, state)
+    return state
 
 def fallback(state):
-    before = state.copy()
-    new = {**state, "next_action": "FALLBACK"}
-    log("FALLBACK", before, new)
-    return new
+    before = state.digest()
+    state.next_action = "FALLBACK"
+    log("FALLBACK", before, state)
+    return state
 
-def run_fsm(state: TradeState):
+def run_fsm(state: FSMState):
 
     decision = policy_gate(state)
     print(f"Policy decision: {decision}")
@@ -186,21 +264,22 @@ def run_fsm(state: TradeState):
     else:
         return fallback(state)
 
-state = {
-    "agent_a": None,
-    "agent_b": None,
-    "final_recommendation": None,
-    "final_confidence": 0.0,
-    "next_action": None,
-    "attempts_a": 0,
-    "attempts_b": 0,
-    "trace": []
-}
+if __name__ == "__main__":
+    state = FSMState(
+        agent_a=None,
+        agent_b=None,
+        final_recommendation=None,
+        final_confidence=0.0,
+        next_action=None,
+        attempts_a=0,
+        attempts_b=0,
+        trace=[],
+    )
 
-state = agent_a_signal(state)
-state = agent_b_signal(state)
-state = aggregate(state)
+    state = agent_a_signal(state)
+    state = agent_b_signal(state)
+    state = aggregate(state)
 
-decision = policy_gate(state)
+    decision = policy_gate(state)
 
-print("Policy:", decision)
\ No newline at end of file
+    print("Policy:", decision)
@@ -17,7 +17,8 @@ class TradeState(TypedDict):
     agent_b: Annotated[Optional[Signal], LastValue(Signal)]
     final_recommendation: Optional[Literal["BUY", "SELL", "HOLD", "REVIEW"]]
     final_confidence: float
-    trace: Annotated[List[str], Topic(list)]
+    # accumulates across steps, so nodes write only their new entries
+    trace: Annotated[List[str], Topic(list, accumulate=True)]
     a_attempts: Annotated[int, LastValue(int)]
     b_attempts: Annotated[int, LastValue(int)]
     request_id: str
@@ -82,7 +83,7 @@ def aggregate_node(state: TradeState):
     A = state["agent_a"]
     B = state["agent_b"]
 
-    trace = state["trace"] + ["aggregate"]
+    trace = ["aggregate"]
 
     if not A or not B:
         return {
@@ -116,7 +117,7 @@ def aggregate_node(state: TradeState):
 def policy_node(state: TradeState):
     log_event(state, "policy")
     return {
-        "trace": state["trace"] + ["policy"]
+        "trace": ["policy"]
     }
 
 # ---- Routers ----
@@ -1,27 +1,37 @@
 import os
-import json
-import re
-from openai import OpenAI
 import time
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from engine.parsing import signal_schema, parse_signal
 
-def call_llm(prompt: str) -> dict:
-    resp = client.chat.completions.create(
+client = None
+
+def get_client():
+    # deferred: importing openai and building the client is slow on cold start
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return client
+
+def _complete(prompt: str) -> str:
+    resp = get_client().chat.completions.create(
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
+        temperature=0.3,
+        response_format=signal_schema("trading")
     )
+    return resp.choices[0].message.content
 
-    raw = resp.choices[0].message.content
+def call_llm(prompt: str) -> dict:
+    # strict parse first, tolerant extraction (fences, prose) as fallback
+    return parse_signal(_complete(prompt), "trading")
 
-    # strip markdown fences
-    raw = raw.strip()
-    raw = re.sub(r"^```json", "", raw)
-    raw = re.sub(r"```$", "", raw)
-    raw = raw.strip()
+# raw answers for fsm.py, which extracts the JSON itself
+def llm_call_agent_a(symbol: str = "TMPV") -> str:
+    return _complete(agent_a_prompt(symbol))
 
-    return json.loads(raw)
+def llm_call_agent_b(symbol: str = "TMPV") -> str:
+    return _complete(agent_b_prompt(symbol))
 
 def agent_a_prompt(symbol: str):
     return f"""